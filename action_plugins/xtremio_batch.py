@@ -0,0 +1,303 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+# Runs many items of an xtremio module on the controller, in one process
+# and from one read of the XMS, instead of one module process per loop item.
+# See library/xtremio_batch.py for the documentation.
+
+import os
+
+from ansible.module_utils.parsing.convert_bool import boolean
+from ansible.module_utils.six import string_types
+from ansible.plugins.action import ActionBase
+
+try:
+    from ansible.module_utils.xtremio_utils import (XMSRest, XtremIOError, index_by_name, parse_sizes, xtremio_client,
+                                                    DEFAULT_WORKERS)
+except ImportError:
+    # Custom module_utils are only visible to modules, so fall back to the
+    # copy that ships next to this plugin
+    import ansible.module_utils
+    ansible.module_utils.__path__.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                                      'module_utils'))
+    from ansible.module_utils.xtremio_utils import (XMSRest, XtremIOError, index_by_name, parse_sizes, xtremio_client,
+                                                    DEFAULT_WORKERS)
+from ansible.module_utils.xtremio_perf import CallRecorder
+from ansible.module_utils.xtremio_throttle import XMSThrottle
+from ansible.module_utils.xtremio_cache import ObjectCache
+from ansible.module_utils.xtremio_plan import Plan
+from ansible.module_utils.xtremio_reconcile import (VOLUME_PROPS, LUN_MAP_PROPS, IG_PROPS, INITIATOR_PROPS, plan_volume,
+                                                    plan_mapping, plan_ig, check_initiator, plan_initiators)
+
+BATCH_OPTIONS = ('module', 'items', 'item_key', 'xms', 'username', 'password', 'validate_certs', 'max_workers',
+                 'rate_limit', 'retries', 'perf', 'perf_trace_file', 'object_cache', 'object_cache_ttl',
+                 'object_cache_size')
+
+
+class ItemError(Exception):
+    pass
+
+
+def item_state(args):
+    state = args.get('state', 'present')
+    if state not in ('present', 'absent'):
+        raise ItemError('invalid state ' + str(state))
+    return state
+
+
+class ItemHandler(object):
+    """Plans the items of one module with the planning functions its bulk mode uses
+
+    key() names the object an item is about, the same as the name of the
+    plan steps made for it. Each item is planned on its own by plan_item().
+    """
+
+    def index(self, objects):
+        return index_by_name(objects)
+
+    def plan(self, xms, current, entries):
+        """Plan entries, a list of (index, key, args), returning the plan and the errors by item index"""
+        plan = Plan('xtremio_batch', xms, None)
+        errors = {}
+        for index, key, args in entries:
+            try:
+                self.plan_item(plan, current, key, args)
+            except (ItemError, XtremIOError) as e:
+                errors[index] = str(e)
+        return plan, errors
+
+
+class MapItems(ItemHandler):
+    """xtremio_map items: volume, ig, state"""
+
+    objtype = 'lun-maps'
+    props = LUN_MAP_PROPS
+
+    def index(self, objects):
+        return set((m['vol-name'], m['ig-name']) for m in objects)
+
+    def key(self, args):
+        if not args.get('volume') or not args.get('ig'):
+            raise ItemError('volume and ig are required')
+        return args['volume'] + '/' + args['ig']
+
+    def plan_item(self, plan, current, key, args):
+        plan_mapping(plan, (args['volume'], args['ig']) in current, args['volume'], args['ig'], item_state(args))
+
+
+class VolumeItems(ItemHandler):
+    """xtremio_volume items: name, size, state"""
+
+    objtype = 'volumes'
+    props = VOLUME_PROPS
+
+    def key(self, args):
+        if not args.get('name'):
+            raise ItemError('name is required')
+        return args['name']
+
+    def plan_item(self, plan, current, key, args):
+        size = None
+        if args.get('size'):
+            size = parse_sizes([args['size']])[0]
+            if not size:
+                raise ItemError('unable to parse size ' + str(args['size']) + ' of volume ' + key)
+        plan_volume(plan, current.get(key), key, size, item_state(args))
+
+
+class IGItems(ItemHandler):
+    """xtremio_ig items: name, state"""
+
+    objtype = 'initiator-groups'
+    props = IG_PROPS
+
+    def key(self, args):
+        if not args.get('name'):
+            raise ItemError('name is required')
+        return args['name']
+
+    def plan_item(self, plan, current, key, args):
+        plan_ig(plan, current.get(key), key, item_state(args))
+
+
+class InitiatorItems(ItemHandler):
+    """xtremio_initiator items: name, ig, os, address, state
+
+    Planned all together, as xtremio_initiator does with initiators (without
+    move), since one initiator may have to give up its address to another.
+    """
+
+    objtype = 'initiators'
+    props = INITIATOR_PROPS
+
+    def key(self, args):
+        if not args.get('name'):
+            raise ItemError('name is required')
+        return args['name']
+
+    def plan(self, xms, current, entries):
+        errors = {}
+        valid = []
+        addresses = {}
+        for index, key, args in entries:
+            try:
+                entry = check_initiator(dict(args, state=item_state(args)))
+            except (ItemError, XtremIOError) as e:
+                errors[index] = str(e)
+                continue
+            if entry['state'] == 'present':
+                if entry['address'] in addresses:
+                    errors[index] = 'address ' + entry['address'] + ' is also given for ' + addresses[entry['address']]
+                    continue
+                addresses[entry['address']] = key
+            valid.append((index, entry))
+
+        # Drop the items the planner finds problems with and plan the rest
+        # again, until what is left can all be done
+        while True:
+            plan = Plan('xtremio_batch', xms, None)
+            problems = plan_initiators(plan, current, [entry for index, entry in valid], False)
+            indexes = dict((entry['name'], index) for index, entry in valid)
+            for names, msg in problems:
+                for name in names:
+                    if name in indexes:
+                        errors[indexes[name]] = msg
+            remaining = [(index, entry) for index, entry in valid if index not in errors]
+            if not problems or len(remaining) == len(valid):
+                return plan, errors
+            valid = remaining
+
+
+HANDLERS = {
+    'xtremio_map': MapItems,
+    'xtremio_volume': VolumeItems,
+    'xtremio_ig': IGItems,
+    'xtremio_initiator': InitiatorItems,
+}
+
+
+class ActionModule(ActionBase):
+
+    TRANSFERS_FILES = False
+
+    def run(self, tmp=None, task_vars=None):
+        result = super(ActionModule, self).run(tmp, task_vars)
+        del tmp
+
+        args = self._task.args
+        module = args.get('module')
+        items = args.get('items')
+        item_key = args.get('item_key')
+        if module not in HANDLERS:
+            return dict(result, failed=True, msg='module must be one of ' + ', '.join(sorted(HANDLERS)))
+        if not isinstance(items, list):
+            return dict(result, failed=True, msg='items must be a list')
+        for key in ('xms', 'username', 'password'):
+            if not args.get(key):
+                return dict(result, failed=True, msg=key + ' is required')
+        defaults = dict((k, v) for k, v in args.items() if k not in BATCH_OPTIONS)
+
+        def item_args(item):
+            itemargs = dict(defaults)
+            if isinstance(item, dict):
+                itemargs.update(item)
+            elif item_key and isinstance(item, (string_types, int)):
+                itemargs[item_key] = item
+            else:
+                raise ItemError('items must be dicts of module arguments, or item_key must be set')
+            return itemargs
+
+        max_workers = int(args.get('max_workers') or DEFAULT_WORKERS)
+        recorder = CallRecorder() if args.get('perf') or args.get('perf_trace_file') else None
+        throttle = XMSThrottle(args['xms'], float(args.get('rate_limit') or 0), int(args.get('retries', 3)),
+                               max_workers)
+        cache = None
+        if args.get('object_cache'):
+            cache = ObjectCache(args['object_cache'], args['xms'], int(args.get('object_cache_ttl') or 60),
+                                int(args.get('object_cache_size') or 1000))
+        rest = XMSRest(args['xms'], args['username'], args['password'],
+                       validate_certs=boolean(args.get('validate_certs', True), strict=False), recorder=recorder,
+                       throttle=throttle, cache=cache)
+        handler = HANDLERS[module]()
+
+        # Every item is about one object. An object that more than one item
+        # is about would be changed by several requests at once, so only the
+        # first of those items is applied
+        errors = {}
+        entries = []
+        keys = {}
+        for index, item in enumerate(items):
+            try:
+                itemargs = item_args(item)
+                key = handler.key(itemargs)
+            except ItemError as e:
+                errors[index] = str(e)
+                continue
+            if key in keys:
+                errors[index] = key + ' is already handled by item ' + str(keys[key])
+                continue
+            keys[key] = index
+            entries.append((index, key, itemargs))
+
+        try:
+            try:
+                current = handler.index(rest.iter_objects(handler.objtype, handler.props))
+            except Exception as e:
+                return dict(result, failed=True, msg='error accessing xms - ' + str(e))
+
+            plan, planerrors = handler.plan(args['xms'], current, entries)
+            errors.update(planerrors)
+            steps = {}
+            for step in plan.steps:
+                steps.setdefault(keys[step['name']], []).append(step)
+
+            done = []
+            failed = []
+            skipped = []
+            if plan.steps and not self._play_context.check_mode:
+                try:
+                    client = xtremio_client(args['xms'], args['username'], args['password'], throttle, recorder, cache)
+                except Exception as e:
+                    return dict(result, failed=True, msg='error accessing xms - ' + str(e))
+                done, failed, skipped = plan.run(client, max_workers)
+        finally:
+            rest.close()
+            if cache is not None:
+                try:
+                    cache.flush()
+                except (IOError, OSError) as e:
+                    result.setdefault('warnings', []).append('unable to write object cache - ' + str(e))
+
+        results = []
+        for index, item in enumerate(items):
+            itemresult = dict(item=item, ansible_loop_var='item', changed=False, failed=False)
+            itemsteps = steps.get(index, [])
+            if index in errors:
+                itemresult.update(failed=True, msg=errors[index])
+            elif self._play_context.check_mode:
+                itemresult['changed'] = bool(itemsteps)
+            else:
+                itemresult['changed'] = any(step in done for step in itemsteps)
+                msgs = [str(e) for step, e in failed if step in itemsteps]
+                if any(step in skipped for step in itemsteps):
+                    msgs.append('not applied, as changes it depends on failed')
+                if msgs:
+                    itemresult.update(failed=True, msg='; '.join(msgs))
+            results.append(itemresult)
+
+        result['results'] = results
+        result['changed'] = any(r['changed'] for r in results)
+        if any(r['failed'] for r in results):
+            result['failed'] = True
+            result['msg'] = 'One or more items failed'
+        else:
+            result['msg'] = 'All items completed'
+        if args.get('perf'):
+            result['perf'] = recorder.summary()
+            result['perf']['throttle'] = throttle.stats()
+        if args.get('perf_trace_file'):
+            try:
+                recorder.write_spans(args['perf_trace_file'], 'xtremio_batch')
+            except (IOError, OSError) as e:
+                result.setdefault('warnings', []).append('unable to write perf trace - ' + str(e))
+        return result
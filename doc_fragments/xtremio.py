@@ -0,0 +1,50 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+
+class ModuleDocFragment(object):
+
+    # Rate limiting, retries, timing and object cache options shared by the xtremio modules
+    DOCUMENTATION = '''
+options:
+    validate_certs:
+        description:
+            - Whether the XMS certificate is checked by the REST requests the module makes. Only set this to false for an XMS
+              with a self-signed certificate, on a network you trust, as the XMS credentials are sent with every request.
+              Calls made with the xtremio client are left to its own certificate handling
+        type: bool
+        default: true
+    rate_limit:
+        description:
+            - Maximum XMS requests per second, shared by every task on this host talking to the same XMS. 0 means no limit
+        default: 0
+    retries:
+        description:
+            - Number of times a lookup is retried, with jittered exponential backoff, when the XMS is busy (HTTP 429/503) or unreachable.
+              Changes are only retried when the XMS turns them away as busy (HTTP 429)
+        default: 3
+    perf:
+        description:
+            - Add timings of the XMS calls made by the module (count, latency and size per endpoint) to the result under perf
+        type: bool
+        default: false
+    perf_trace_file:
+        description:
+            - File to append OpenTelemetry-style JSON spans to, one for the module run and one for each XMS call
+    object_cache:
+        description:
+            - File to cache looked up objects in between tasks, on the host the module runs on (usually the controller), so that
+              later tasks in the play don't read the same volumes, CGs and IGs from the XMS again.
+              Updated with every change a module makes
+            - Objects that are not found are not cached, but objects deleted by a module are remembered as missing. Changes made
+              by anything other than the xtremio tasks of the play (such as an object created by another tool after a module
+              deleted it) are only seen once the cached object expires
+    object_cache_ttl:
+        description:
+            - Number of seconds an object in object_cache is used for before it is read from the XMS again
+        default: 60
+    object_cache_size:
+        description:
+            - Maximum number of objects kept in object_cache per XMS, the least recently used are dropped beyond that
+        default: 1000
+'''
@@ -0,0 +1,308 @@
+#!/usr/bin/env python
+"""Benchmark the xtremio modules against the local XMS simulator.
+
+Each scenario seeds the simulator with N objects, runs a module's
+run_module() in-process and reports the number of XMS round trips, wall
+time and peak Python memory:
+
+    python hacking/benchmark.py --sizes 10,1000,10000 --latency 2
+
+Needs ansible installed. The xtremio client library is not used: XMS calls
+the modules make through it are served by SimClient, which issues the same
+single-object REST requests the client would.
+"""
+
+import argparse
+import importlib.util
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, HERE)
+
+import ansible.module_utils
+ansible.module_utils.__path__.append(os.path.join(ROOT, 'module_utils'))
+
+from ansible.module_utils import basic
+from ansible.module_utils._text import to_bytes
+from ansible.module_utils import xtremio_utils
+from ansible.module_utils.xtremio_utils import XMSRest, XMSError
+from xms_simulator import XMSSimulator
+
+
+class SimClient(object):
+    """Stand-in for xtremio.XtremIO that talks to the simulator"""
+
+    def __init__(self, xms, username, password):
+        self.rest = XMSRest(xms, username, password)
+
+    def _get(self, objtype, name):
+        try:
+            return self.rest.get(objtype, [('name', name)])['content']
+        except XMSError as e:
+            if e.status == 404:
+                return None
+            raise
+
+    def _post(self, objtype, body):
+        return self.rest.request('POST', self.rest.path(objtype), body)
+
+    def _put(self, objtype, name, body):
+        return self.rest.request('PUT', self.rest.path(objtype, [('name', name)]), body)
+
+    def _delete(self, objtype, params):
+        return self.rest.request('DELETE', self.rest.path(objtype, params))
+
+    def get_volume(self, name):
+        return self._get('volumes', name)
+
+    def create_volume(self, name, size):
+        self._post('volumes', {'vol-name': name, 'vol-size': str(size)})
+
+    def modify_volume(self, volume, size=None, name=None):
+        body = {}
+        if size:
+            body['vol-size'] = str(size)
+        if name:
+            body['vol-name'] = name
+        self._put('volumes', volume, body)
+
+    def remove_volume(self, name):
+        self._delete('volumes', [('name', name)])
+
+    def get_cg(self, name):
+        return self._get('consistency-groups', name)
+
+    def create_cg(self, name, volumes=None):
+        self._post('consistency-groups', {'consistency-group-name': name, 'vol-list': volumes})
+
+    def modify_cg(self, name, add=None, remove=None):
+        if add:
+            self._put('consistency-groups', name, {'add-volume': add})
+        if remove:
+            self._put('consistency-groups', name, {'remove-volume': remove})
+
+    def remove_cg(self, name):
+        self._delete('consistency-groups', [('name', name)])
+
+    def get_ig(self, name):
+        return self._get('initiator-groups', name)
+
+    def create_ig(self, name):
+        self._post('initiator-groups', {'ig-name': name})
+
+    def remove_ig(self, name):
+        self._delete('initiator-groups', [('name', name)])
+
+    def get_initiator(self, name):
+        return self._get('initiators', name)
+
+    def create_initiator(self, name, ig, address, os):
+        self._post('initiators', {'initiator-name': name, 'ig-id': ig, 'port-address': address,
+                                  'operating-system': os})
+
+    def modify_initiator(self, name, os=None, address=None):
+        body = {}
+        if os:
+            body['operating-system'] = os
+        if address:
+            body['port-address'] = address
+        self._put('initiators', name, body)
+
+    def remove_initiator(self, name):
+        self._delete('initiators', [('name', name)])
+
+    def get_volume_mapping(self, volume, ig):
+        maps = self.rest.get('lun-maps', [('full', 1), ('filter', 'vol-name:eq:' + volume),
+                                          ('filter', 'ig-name:eq:' + ig)])['lun-maps']
+        return maps[0] if maps else None
+
+    def create_volume_mapping(self, volume, ig):
+        self._post('lun-maps', {'vol-id': volume, 'ig-id': ig})
+
+    def remove_volume_mapping(self, volume, ig):
+        self._delete('lun-maps', [('vol-name', volume), ('ig-name', ig)])
+
+    def get_snapshot_set(self, name):
+        return self._get('snapshot-sets', name)
+
+    def modify_snapshot_set(self, ssname, name=None):
+        self._put('snapshot-sets', ssname, {'name': name})
+
+    def remove_snapshot_set(self, name):
+        self._delete('snapshot-sets', [('name', name)])
+
+    def create_snapshot(self, vol=None, cg=None, ss=None, ssname=None, suffix=None):
+        body = {'snapshot-set-name': ssname, 'snap-suffix': suffix}
+        if vol:
+            body['volume-list'] = [vol]
+        if cg:
+            body['consistency-group-id'] = cg
+        if ss:
+            body['snapshot-set-id'] = ss
+        self._post('snapshots', body)
+
+    def refresh_snapshot(self, fromvol=None, tovol=None, fromcg=None, fromss=None, toss=None, tocg=None,
+                         ss=None, nobackup=False):
+        body = {'snapshot-set-name': ss}
+        for key, value in (('from-volume-id', fromvol), ('to-volume-id', tovol),
+                           ('from-consistency-group-id', fromcg), ('from-snapshot-set-id', fromss),
+                           ('to-snapshot-set-id', toss), ('to-consistency-group-id', tocg)):
+            if value:
+                body[key] = value
+        self._post('snapshots', body)
+
+
+xtremio_utils.XtremIO = SimClient
+xtremio_utils.HAS_XTREMIO = True
+
+
+def load_module(name):
+    spec = importlib.util.spec_from_file_location(name, os.path.join(ROOT, 'library', name + '.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def run_module(name, args):
+    """Run library/<name>.py with args and return its result dict"""
+    module = load_module(name)
+    basic._ANSIBLE_ARGS = to_bytes(json.dumps({'ANSIBLE_MODULE_ARGS': args}))
+    stdout = sys.stdout
+    sys.stdout = io.StringIO()
+    try:
+        module.run_module()
+    except SystemExit:
+        pass
+    finally:
+        output = sys.stdout.getvalue()
+        sys.stdout = stdout
+    return json.loads(output)
+
+
+FACTS_CACHE = os.path.join(tempfile.gettempdir(), 'xtremio-benchmark-facts.json')
+
+
+def sync_facts_cache(server, params):
+    """Write a synced facts cache, then change a few objects behind its back"""
+    if os.path.exists(FACTS_CACHE):
+        os.unlink(FACTS_CACHE)
+    run_module('xtremio_facts', params)
+    state = server.state
+    state.post('volumes', {'vol-name': 'bench-newvol', 'vol-size': 1048576})
+    state.put('volumes', {'name': ['vol00001']}, {'vol-size': '2097152'})
+    state.delete('volumes', {'name': ['vol00002']})
+    state.post('lun-maps', {'vol-id': 'bench-newvol', 'ig-id': 'ig00000'})
+
+
+# Each scenario is (name, module, seed(n), args(n)), optionally followed by
+# prepare(server, params), run after seeding and before measuring
+SCENARIOS = [
+    ('volume-single', 'xtremio_volume',
+     lambda n: dict(volumes=n),
+     lambda n: dict(name='bench-vol', size='10GB')),
+    ('volume-bulk', 'xtremio_volume',
+     lambda n: dict(volumes=n // 2),
+     lambda n: dict(volumes=[dict(name='vol%05d' % i, size='2GB') for i in range(n)])),
+    ('ig', 'xtremio_ig',
+     lambda n: dict(igs=n),
+     lambda n: dict(name='bench-ig')),
+    ('initiator', 'xtremio_initiator',
+     lambda n: dict(igs=n),
+     lambda n: dict(name='bench-hba', ig='ig00000', os='linux', address='20:00:00:00:00:00:00:01')),
+    ('initiator-bulk', 'xtremio_initiator',
+     lambda n: dict(igs=max(n // 2, 1)),
+     lambda n: dict(os='linux', initiators=[dict(name='ig%05d-hba%d' % (i // 2, i % 2), ig='ig%05d' % (i // 2),
+                                                 address='20%014x' % i) for i in range(n)])),
+    ('map-single', 'xtremio_map',
+     lambda n: dict(volumes=n, igs=1),
+     lambda n: dict(volume='vol%05d' % (n - 1), ig='ig00000')),
+    ('map-batch', 'xtremio_map',
+     lambda n: dict(volumes=n, igs=2),
+     lambda n: dict(volumes=['vol%05d' % i for i in range(n)], igs=['ig00000', 'ig00001'])),
+    ('cg', 'xtremio_cg',
+     lambda n: dict(volumes=n, cgs=1, vols_per_cg=n // 2),
+     lambda n: dict(name='cg00000', volumes=['vol%05d' % i for i in range(n // 4, n)])),
+    ('snapshot', 'xtremio_snapshot',
+     lambda n: dict(volumes=n, cgs=1, vols_per_cg=n),
+     lambda n: dict(sourcecg='cg00000', targetss='bench-ss', suffix='bench')),
+    ('snapshot-vols', 'xtremio_snapshot',
+     lambda n: dict(volumes=n),
+     lambda n: dict(sourcevols=['vol%05d' % i for i in range(n)], targetss='bench-ss', suffix='bench')),
+    ('cg-snapshot-map', 'xtremio_cg_snapshot',
+     lambda n: dict(volumes=n, igs=1, cgs=1, vols_per_cg=n),
+     lambda n: dict(cg='cg00000', targetss='bench-ss', suffix='bench', ig='ig00000')),
+    ('snapshot-prune', 'xtremio_snapshot',
+     lambda n: dict(snapshot_sets=n),
+     lambda n: dict(prune='ss*', keep=24, state='absent')),
+    ('teardown', 'xtremio_teardown',
+     lambda n: dict(volumes=n, igs=max(n // 10, 1), maps_per_ig=10),
+     lambda n: dict(igs=['ig%05d' % i for i in range(min(n // 10, 50))], delete_volumes=True)),
+    ('facts', 'xtremio_facts',
+     lambda n: dict(volumes=n, igs=max(n // 10, 1), maps_per_ig=10, cgs=1, vols_per_cg=min(n, 10)),
+     lambda n: dict()),
+    ('facts-incremental', 'xtremio_facts',
+     lambda n: dict(volumes=n, igs=max(n // 10, 1), maps_per_ig=10, cgs=1, vols_per_cg=min(n, 10)),
+     lambda n: dict(cache_file=FACTS_CACHE, cache_ttl=0, incremental=True),
+     sync_facts_cache),
+    ('host', 'xtremio_host',
+     lambda n: dict(volumes=n, igs=max(n // 10, 1)),
+     lambda n: dict(name='bench-host', initiators=[dict(name='bench-hba%d' % i, address='30:00:00:00:00:00:00:%02x' % i)
+                                                    for i in range(2)],
+                    volumes=[dict(name='bench-hostvol%d' % i, size='10GB') for i in range(4)])),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='10,1000,10000', help='comma separated object counts')
+    parser.add_argument('--latency', type=float, default=0.0, help='simulated per-request latency in milliseconds')
+    parser.add_argument('--scenario', action='append', help='only run the named scenario(s)')
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args()
+
+    server = XMSSimulator(('127.0.0.1', 0), args.latency / 1000.0).start()
+    common = dict(xms=server.url, username='admin', password='admin')
+
+    results = []
+    for size in [int(s) for s in args.sizes.split(',')]:
+        for scenario in SCENARIOS:
+            name, module, seed, modargs = scenario[:4]
+            if args.scenario and name not in args.scenario:
+                continue
+            server.state.seed(**seed(size))
+            params = dict(common)
+            params.update(modargs(size))
+            if len(scenario) > 4:
+                scenario[4](server, params)
+            server.stats.reset()
+            tracemalloc.start()
+            start = time.time()
+            result = run_module(module, params)
+            elapsed = time.time() - start
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            stats = server.stats.as_dict()
+            results.append(dict(scenario=name, objects=size, round_trips=stats['requests'],
+                                bytes=stats['bytes_out'], wall=round(elapsed, 3), peak_mb=round(peak / 1048576.0, 2),
+                                failed=bool(result.get('failed')), msg=result.get('msg', '')))
+
+    server.shutdown()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print('%-18s %8s %11s %12s %9s %9s  %s' % ('scenario', 'objects', 'round trips', 'bytes', 'wall s', 'peak MB', ''))
+    for r in results:
+        print('%-18s %8d %11d %12d %9.3f %9.2f  %s' % (r['scenario'], r['objects'], r['round_trips'], r['bytes'],
+                                                       r['wall'], r['peak_mb'], 'FAILED: ' + r['msg'] if r['failed'] else ''))
+
+
+if __name__ == '__main__':
+    main()
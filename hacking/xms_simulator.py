@@ -0,0 +1,458 @@
+#!/usr/bin/env python
+"""Local stand-in for an XMS REST API, for benchmarking the xtremio modules.
+
+Implements the parts of /api/json/v2/types/ that the modules use, keeping
+every object in memory and logging an event for each change. Every request
+sleeps for --latency milliseconds and is counted, so round trips can be
+measured without a real array.
+
+The wire format (endpoints, filters, paging, bodies) is the one the modules
+assume, not one checked against a real XMS: a module and the simulator
+agreeing says nothing about whether the XMS would accept the call.
+
+    python hacking/xms_simulator.py --port 8443 --volumes 1000 --latency 5
+
+GET  /sim/stats   request counters since the last reset
+POST /sim/reset   zero the counters
+POST /sim/seed    replace the contents with {"volumes": N, "igs": N, ...}
+"""
+
+import argparse
+import json
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import urlparse, parse_qs
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import urlparse, parse_qs
+
+API_PATH = '/api/json/v2/types/'
+TYPES = ['volumes', 'snapshots', 'snapshot-sets', 'consistency-groups',
+         'initiator-groups', 'initiators', 'lun-maps']
+
+# Event log entity of each type
+ENTITIES = {
+    'volumes': 'Volume',
+    'snapshots': 'Snapshot',
+    'snapshot-sets': 'SnapshotSet',
+    'consistency-groups': 'ConsistencyGroup',
+    'initiator-groups': 'InitiatorGroup',
+    'initiators': 'Initiator',
+    'lun-maps': 'LunMap',
+}
+
+
+class NotFound(Exception):
+    pass
+
+
+class BadRequest(Exception):
+    pass
+
+
+class XMSState(object):
+    """In-memory XMS objects, keyed by type and name"""
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.objects = dict((t, OrderedDict()) for t in TYPES)
+            self.next_index = 1
+            self.events = []
+
+    def seed(self, volumes=0, igs=0, initiators_per_ig=2, maps_per_ig=0, cgs=0, vols_per_cg=0,
+             snapshot_sets=0):
+        with self.lock:
+            self.reset()
+            for i in range(volumes):
+                self.add_volume('vol%05d' % i, 1048576)
+            for i in range(igs):
+                ig = 'ig%05d' % i
+                self.add('initiator-groups', ig, {})
+                for j in range(initiators_per_ig):
+                    self.add('initiators', '%s-hba%d' % (ig, j), {
+                        'ig-name': ig,
+                        'port-address': '10:00:00:00:%02x:%02x:%02x:%02x' % ((i >> 8) & 0xff, i & 0xff, j, 0),
+                        'operating-system': 'linux'})
+                for j in range(min(maps_per_ig, volumes)):
+                    self.add_map('vol%05d' % ((i * maps_per_ig + j) % volumes), ig)
+            for i in range(cgs):
+                members = ['vol%05d' % ((i * vols_per_cg + j) % max(volumes, 1))
+                           for j in range(min(vols_per_cg, volumes))]
+                self.add_cg('cg%05d' % i, members)
+            for i in range(snapshot_sets):
+                ts = time.time() - i * 3600
+                self.add('snapshot-sets', 'ss%05d' % i, {
+                    'vol-list': [],
+                    'creation-time': time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(ts))})
+            self.events = []
+
+    # Object helpers
+
+    def log(self, objtype, name, what):
+        now = time.time()
+        self.events.append({'id': len(self.events) + 1, 'entity': ENTITIES[objtype], 'entity_details': name,
+                            'timestamp': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(now)) +
+                            '.%03d' % (now * 1000 % 1000),
+                            'description': '%s %s %s' % (ENTITIES[objtype], name, what)})
+
+    def add(self, objtype, name, attrs):
+        if name in self.objects[objtype]:
+            raise BadRequest('%s %s already exists' % (objtype, name))
+        obj = dict(attrs)
+        obj['name'] = name
+        obj['index'] = self.next_index
+        self.next_index += 1
+        self.objects[objtype][name] = obj
+        self.log(objtype, name, 'created')
+        return obj
+
+    def find(self, objtype, name):
+        try:
+            return self.objects[objtype][name]
+        except KeyError:
+            raise NotFound('%s %s not found' % (objtype, name))
+
+    def ref(self, obj):
+        return [str(obj['index']), obj['name'], obj['index']]
+
+    def add_volume(self, name, size, objtype='volumes'):
+        obj = self.add(objtype, name, {'vol-size': str(size),
+                                       'creation-time': time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime())})
+        if objtype == 'snapshots':
+            self.objects['volumes'][name] = obj
+        return obj
+
+    def remove_volume(self, name):
+        vol = self.find('volumes', name)
+        for key in [k for k, m in self.objects['lun-maps'].items() if m['vol-name'] == name]:
+            del self.objects['lun-maps'][key]
+        for cg in self.objects['consistency-groups'].values():
+            cg['vol-list'] = [v for v in cg['vol-list'] if v[1] != name]
+        for ss in self.objects['snapshot-sets'].values():
+            ss['vol-list'] = [v for v in ss['vol-list'] if v[1] != name]
+        del self.objects['volumes'][name]
+        self.objects['snapshots'].pop(name, None)
+        self.log('volumes', name, 'removed')
+        return vol
+
+    def add_cg(self, name, members):
+        return self.add('consistency-groups', name,
+                        {'vol-list': [self.ref(self.find('volumes', v)) for v in members]})
+
+    def add_map(self, volname, igname):
+        self.find('volumes', volname)
+        self.find('initiator-groups', igname)
+        key = volname + '/' + igname
+        if key in self.objects['lun-maps']:
+            raise BadRequest('mapping %s already exists' % key)
+        lun = 1 + len([m for m in self.objects['lun-maps'].values() if m['ig-name'] == igname])
+        obj = {'name': key, 'vol-name': volname, 'ig-name': igname, 'lun': lun, 'index': self.next_index}
+        self.next_index += 1
+        self.objects['lun-maps'][key] = obj
+        self.log('lun-maps', key, 'created')
+        return obj
+
+    def snapshot(self, volumes, ssname, suffix):
+        snaps = []
+        for vol in volumes:
+            src = self.find('volumes', vol)
+            snap = self.add_volume(vol + '.' + suffix, src['vol-size'], 'snapshots')
+            snap['ancestor-vol-id'] = self.ref(src)
+            snaps.append(self.ref(snap))
+        return self.add('snapshot-sets', ssname, {'vol-list': snaps,
+                                                  'creation-time': time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime())})
+
+    def remove_snapshot_set(self, name):
+        ss = self.find('snapshot-sets', name)
+        for vol in ss['vol-list']:
+            if vol[1] in self.objects['volumes']:
+                self.remove_volume(vol[1])
+        del self.objects['snapshot-sets'][name]
+        self.log('snapshot-sets', name, 'removed')
+
+    def members(self, cg=None, ss=None):
+        if cg:
+            return [v[1] for v in self.find('consistency-groups', cg)['vol-list']]
+        # Snapshot names carry the suffix of the set they were taken in
+        return [v[1].rsplit('.', 1)[0] for v in self.find('snapshot-sets', ss)['vol-list']]
+
+    def view(self, objtype, obj):
+        obj = dict(obj)
+        if objtype == 'initiator-groups':
+            obj['num-of-vols'] = len([m for m in self.objects['lun-maps'].values() if m['ig-name'] == obj['name']])
+        return obj
+
+    # REST verbs
+
+    def get_events(self, query):
+        with self.lock:
+            events = self.events[::-1]
+            if 'from-date-time' in query:
+                since = query['from-date-time'][0]
+                events = [e for e in events if e['timestamp'][:19] >= since]
+            start = int(query.get('from-index', ['0'])[0])
+            if 'limit' in query:
+                return {'events': events[start:start + int(query['limit'][0])]}
+            return {'events': events[start:]}
+
+    def get(self, objtype, query):
+        with self.lock:
+            if 'name' in query:
+                return {'content': self.view(objtype, self.find(objtype, query['name'][0]))}
+            objects = list(self.objects[objtype].values())
+            for flt in query.get('filter', []):
+                prop, op, value = flt.split(':', 2)
+                objects = [o for o in objects if str(o.get(prop)) == value]
+            start = int(query.get('from-index', ['0'])[0])
+            if 'limit' in query:
+                objects = objects[start:start + int(query['limit'][0])]
+            else:
+                objects = objects[start:]
+            objects = [self.view(objtype, o) for o in objects]
+            if 'full' not in query:
+                return {objtype: [{'name': o['name'], 'href': API_PATH + objtype + '/%d' % o['index']}
+                                  for o in objects]}
+            props = query.get('prop')
+            if props:
+                objects = [dict((p, o[p]) for p in props if p in o) for o in objects]
+            return {objtype: objects}
+
+    def post(self, objtype, body):
+        with self.lock:
+            if objtype == 'volumes':
+                return self.add_volume(body['vol-name'], int(body['vol-size']))
+            if objtype == 'consistency-groups':
+                return self.add_cg(body['consistency-group-name'], body.get('vol-list') or [])
+            if objtype == 'initiator-groups':
+                return self.add('initiator-groups', body['ig-name'], {})
+            if objtype == 'initiators':
+                self.find('initiator-groups', body['ig-id'])
+                return self.add('initiators', body['initiator-name'], {
+                    'ig-name': body['ig-id'], 'port-address': body['port-address'],
+                    'operating-system': body['operating-system']})
+            if objtype == 'lun-maps':
+                return self.add_map(body['vol-id'], body['ig-id'])
+            if objtype == 'snapshots':
+                return self.post_snapshot(body)
+            raise BadRequest('POST not supported for ' + objtype)
+
+    def post_snapshot(self, body):
+        ssname = body.get('snapshot-set-name') or 'SnapshotSet.%d' % self.next_index
+        suffix = body.get('snap-suffix') or str(self.next_index)
+        if 'to-snapshot-set-id' in body or 'to-volume-id' in body:
+            # Refresh: replace the target with a new copy of the source
+            if 'to-volume-id' in body:
+                target = self.find('volumes', body['to-volume-id'])
+                target['vol-size'] = self.find('volumes', body['from-volume-id'])['vol-size']
+                return target
+            if 'from-consistency-group-id' in body:
+                source = self.members(cg=body['from-consistency-group-id'])
+            else:
+                source = self.members(ss=body['from-snapshot-set-id'])
+            self.remove_snapshot_set(body['to-snapshot-set-id'])
+            return self.snapshot(source, ssname, suffix)
+        if 'consistency-group-id' in body:
+            source = self.members(cg=body['consistency-group-id'])
+        elif 'snapshot-set-id' in body:
+            source = self.members(ss=body['snapshot-set-id'])
+        else:
+            source = body['volume-list']
+        return self.snapshot(source, ssname, suffix)
+
+    def put(self, objtype, query, body):
+        with self.lock:
+            obj = self.find(objtype, query['name'][0])
+            if objtype == 'consistency-groups':
+                if 'add-volume' in body:
+                    obj['vol-list'].append(self.ref(self.find('volumes', body['add-volume'])))
+                if 'remove-volume' in body:
+                    obj['vol-list'] = [v for v in obj['vol-list'] if v[1] != body['remove-volume']]
+                self.log(objtype, obj['name'], 'modified')
+                return obj
+            newname = body.pop('name', None) or body.pop('vol-name', None)
+            for key, value in body.items():
+                obj[key] = value
+            if newname:
+                for t in TYPES:
+                    if self.objects[t].get(obj['name']) is obj:
+                        del self.objects[t][obj['name']]
+                        self.objects[t][newname] = obj
+                obj['name'] = newname
+            self.log(objtype, obj['name'], 'modified')
+            return obj
+
+    def delete(self, objtype, query):
+        with self.lock:
+            if objtype == 'lun-maps':
+                key = query['vol-name'][0] + '/' + query['ig-name'][0]
+                if key not in self.objects['lun-maps']:
+                    raise NotFound('mapping %s not found' % key)
+                del self.objects['lun-maps'][key]
+                self.log('lun-maps', key, 'removed')
+            elif objtype in ('volumes', 'snapshots'):
+                self.remove_volume(query['name'][0])
+            elif objtype == 'snapshot-sets':
+                self.remove_snapshot_set(query['name'][0])
+            else:
+                self.find(objtype, query['name'][0])
+                del self.objects[objtype][query['name'][0]]
+                self.log(objtype, query['name'][0], 'removed')
+            return {}
+
+
+class Stats(object):
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.requests = 0
+            self.bytes_out = 0
+            self.by_call = {}
+
+    def record(self, method, objtype, size):
+        with self.lock:
+            self.requests += 1
+            self.bytes_out += size
+            key = method + ' ' + objtype
+            self.by_call[key] = self.by_call.get(key, 0) + 1
+
+    def as_dict(self):
+        with self.lock:
+            return dict(requests=self.requests, bytes_out=self.bytes_out, by_call=dict(self.by_call))
+
+
+class Handler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def send(self, status, body):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+        return len(data)
+
+    def body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if not length:
+            return {}
+        return json.loads(self.rfile.read(length).decode('utf-8'))
+
+    def handle_request(self, method):
+        server = self.server
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        body = self.body() if method in ('POST', 'PUT') else None
+
+        if url.path == '/sim/stats':
+            return self.send(200, server.stats.as_dict())
+        if url.path == '/sim/reset':
+            server.stats.reset()
+            return self.send(200, {})
+        if url.path == '/sim/seed':
+            server.state.seed(**body)
+            server.stats.reset()
+            return self.send(200, {})
+
+        if url.path == API_PATH + 'events' and method == 'GET':
+            if server.latency:
+                time.sleep(server.latency)
+            size = self.send(200, server.state.get_events(query))
+            server.stats.record(method, 'events', size)
+            return
+        if not url.path.startswith(API_PATH) or url.path[len(API_PATH):] not in TYPES:
+            return self.send(404, {'message': 'unknown path ' + url.path})
+        objtype = url.path[len(API_PATH):]
+
+        if server.latency:
+            time.sleep(server.latency)
+        try:
+            if method == 'GET':
+                status, result = 200, server.state.get(objtype, query)
+            elif method == 'POST':
+                status, result = 201, server.state.post(objtype, body)
+                result = {'links': [{'href': API_PATH + objtype + '/%d' % result['index'], 'rel': 'self'}]}
+            elif method == 'PUT':
+                status, result = 200, server.state.put(objtype, query, body)
+                result = {}
+            else:
+                status, result = 200, server.state.delete(objtype, query)
+        except NotFound as e:
+            status, result = 404, {'message': str(e)}
+        except (BadRequest, KeyError, ValueError) as e:
+            status, result = 400, {'message': str(e)}
+        size = self.send(status, result)
+        server.stats.record(method, objtype, size)
+
+    def do_GET(self):
+        self.handle_request('GET')
+
+    def do_POST(self):
+        self.handle_request('POST')
+
+    def do_PUT(self):
+        self.handle_request('PUT')
+
+    def do_DELETE(self):
+        self.handle_request('DELETE')
+
+
+class XMSSimulator(ThreadingMixIn, HTTPServer):
+
+    daemon_threads = True
+
+    def __init__(self, address, latency=0.0):
+        HTTPServer.__init__(self, address, Handler)
+        self.latency = latency
+        self.state = XMSState()
+        self.stats = Stats()
+
+    @property
+    def url(self):
+        return 'http://%s:%d' % self.server_address[:2]
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return self
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8443)
+    parser.add_argument('--latency', type=float, default=0.0, help='per-request latency in milliseconds')
+    parser.add_argument('--volumes', type=int, default=0)
+    parser.add_argument('--igs', type=int, default=0)
+    parser.add_argument('--cgs', type=int, default=0)
+    parser.add_argument('--snapshot-sets', type=int, default=0)
+    args = parser.parse_args()
+
+    server = XMSSimulator((args.host, args.port), args.latency / 1000.0)
+    server.state.seed(volumes=args.volumes, igs=args.igs, cgs=args.cgs, vols_per_cg=min(args.volumes, 10),
+                      snapshot_sets=args.snapshot_sets)
+    print('XMS simulator listening on ' + server.url)
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
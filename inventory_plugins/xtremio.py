@@ -0,0 +1,176 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+DOCUMENTATION = '''
+    name: xtremio
+    plugin_type: inventory
+    short_description: Dell EMC XtremIO Initiator Group inventory source
+    description:
+        - Builds inventory from the Initiator Groups on one or more XtremIO arrays
+        - Every IG becomes a host, with its initiators and mapped volumes as host variables
+        - All arrays are queried in parallel, through the XMS REST API, so the xtremio Python client isn't needed
+        - Arrays that can't be queried are skipped with a warning, and the inventory is then not cached
+        - Uses a YAML configuration file that ends with xtremio.yml or xtremio.yaml
+    author:
+        - Scott Howard (@docbert)
+    extends_documentation_fragment:
+        - inventory_cache
+        - constructed
+    options:
+        plugin:
+            description: token that ensures this is a source file for the 'xtremio' plugin
+            required: true
+            choices: ['xtremio']
+        arrays:
+            description:
+                - List of XMS to query, each a dict with keys xms, username and password, and optionally validate_certs
+                  (default true, set it to false only for an XMS with a self-signed certificate)
+            type: list
+            required: true
+        max_workers:
+            description: Maximum number of arrays queried in parallel
+            type: int
+            default: 8
+'''
+
+EXAMPLES = '''
+# xtremio.yml
+plugin: xtremio
+arrays:
+  - xms: xms1.example.com
+    username: admin
+    password: Xtrem10
+  - xms: xms2.example.com
+    username: admin
+    password: Xtrem10
+cache: true
+cache_plugin: jsonfile
+cache_connection: /tmp/xtremio_inventory
+keyed_groups:
+  - key: xtremio_os
+    prefix: os
+'''
+
+import os
+import re
+
+from ansible.errors import AnsibleParserError
+from ansible.module_utils.parsing.convert_bool import boolean
+from ansible.plugins.inventory import BaseInventoryPlugin, Cacheable, Constructable
+
+try:
+    from ansible.module_utils.xtremio_utils import XMSRest, run_parallel
+except ImportError:
+    # Custom module_utils are only visible to modules, so fall back to the
+    # copy that ships next to this plugin
+    import ansible.module_utils
+    ansible.module_utils.__path__.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                                      'module_utils'))
+    from ansible.module_utils.xtremio_utils import XMSRest, run_parallel
+
+def query_array(array):
+    """Read the IGs of one array, with their initiators and mapped volumes
+
+    Objects are streamed from the XMS and grouped by IG as they arrive.
+    """
+    rest = XMSRest(array['xms'], array['username'], array['password'],
+                   validate_certs=boolean(array.get('validate_certs', True), strict=False))
+    try:
+        igs = [ig['name'] for ig in rest.iter_objects('initiator-groups', ['name'])]
+        initiators = {}
+        for init in rest.iter_objects('initiators', ['name', 'port-address', 'operating-system', 'ig-name']):
+            initiators.setdefault(init['ig-name'], []).append(
+                dict(name=init['name'], address=init['port-address'], os=init['operating-system']))
+        volumes = {}
+        for lunmap in rest.iter_objects('lun-maps', ['vol-name', 'ig-name', 'lun']):
+            volumes.setdefault(lunmap['ig-name'], []).append(dict(name=lunmap['vol-name'], lun=lunmap['lun']))
+        return dict(xms=array['xms'], igs=igs, initiators=initiators, volumes=volumes)
+    finally:
+        rest.close()
+
+
+class InventoryModule(BaseInventoryPlugin, Cacheable, Constructable):
+
+    NAME = 'xtremio'
+
+    def verify_file(self, path):
+        if super(InventoryModule, self).verify_file(path):
+            return path.endswith(('xtremio.yml', 'xtremio.yaml'))
+        return False
+
+    def _query(self, arrays):
+        """Return the results of the arrays that could be queried, and the XMS of those that couldn't"""
+        results = []
+        failed = []
+        for array, result, error in run_parallel(query_array, arrays, self.get_option('max_workers')):
+            if error is not None:
+                # An unreachable array shouldn't hide the others
+                self.display.warning('xtremio: skipping %s - %s' % (array['xms'], error))
+                failed.append(array['xms'])
+                continue
+            results.append(result)
+        return results, failed
+
+    def _populate(self, results):
+        for result in results:
+            xms = result['xms']
+            group = self.inventory.add_group('xtremio_' + re.sub(r'[^A-Za-z0-9_]', '_', xms))
+
+            for name in result['igs']:
+                if name in self.inventory.hosts:
+                    self.display.warning('xtremio: IG %s on %s duplicates a host already in the inventory, skipping' % (name, xms))
+                    continue
+                self.inventory.add_host(name, group=group)
+                inits = result['initiators'].get(name, [])
+                hostvars = dict(
+                    xtremio_xms=xms,
+                    xtremio_ig=name,
+                    xtremio_initiators=inits,
+                    xtremio_wwns=[i['address'] for i in inits],
+                    xtremio_os=inits[0]['os'] if inits else None,
+                    xtremio_volumes=result['volumes'].get(name, []),
+                )
+                for key, value in hostvars.items():
+                    self.inventory.set_variable(name, key, value)
+
+                strict = self.get_option('strict')
+                self._set_composite_vars(self.get_option('compose'), hostvars, name, strict=strict)
+                self._add_host_to_composed_groups(self.get_option('groups'), hostvars, name, strict=strict)
+                self._add_host_to_keyed_groups(self.get_option('keyed_groups'), hostvars, name, strict=strict)
+
+    def parse(self, inventory, loader, path, cache=True):
+        super(InventoryModule, self).parse(inventory, loader, path)
+        self._read_config_data(path)
+
+        arrays = self.get_option('arrays')
+        for array in arrays:
+            if not isinstance(array, dict) or not all(array.get(k) for k in ('xms', 'username', 'password')):
+                raise AnsibleParserError('xtremio: each entry in arrays needs xms, username and password')
+
+        cache_key = self.get_cache_key(path)
+        use_cache = self.get_option('cache') and cache
+        update_cache = self.get_option('cache') and not cache
+
+        results = None
+        if use_cache:
+            try:
+                cached = self._cache[cache_key]
+                if not isinstance(cached, list) or not all(isinstance(result, dict) and
+                                                           isinstance(result.get('initiators'), dict) and
+                                                           isinstance(result.get('volumes'), dict)
+                                                           for result in cached):
+                    # Written by an older version of this plugin
+                    raise KeyError(cache_key)
+                results = cached
+            except KeyError:
+                update_cache = True
+        if results is None:
+            results, failed = self._query(arrays)
+            if failed and update_cache:
+                # Caching now would hide the missing arrays' hosts until the cache expires
+                self.display.warning('xtremio: not caching the inventory as %s could not be queried' % ', '.join(failed))
+                update_cache = False
+        if update_cache:
+            self._cache[cache_key] = results
+
+        self._populate(results)
@@ -0,0 +1,99 @@
+#!/usr/bin/python
+
+ANSIBLE_METADATA = {
+    'metadata_version': '1.1',
+    'status': ['preview'],
+    'supported_by': 'community'
+}
+
+DOCUMENTATION = '''
+---
+module: xtremio_batch
+
+short_description: Run many items of an XtremIO module in one XMS session
+
+description:
+    - "Applies a list of items, each the arguments of one xtremio_map, xtremio_volume, xtremio_ig or xtremio_initiator task,
+      to an XtremIO Array"
+    - "This is an action plugin (action_plugins/xtremio_batch.py) and runs on the controller: use it in place of a loop over one of
+      those modules, which starts a module process, imports the xtremio client and logs in again for every item"
+    - "The objects of the module's type are read once over one keep-alive XMS session and the items are planned the same way the
+      module's bulk mode plans them. The changes are then made in parallel through the xtremio client, which must be installed on
+      the controller"
+    - "Each object can only be handled by one item. Later items about an object that an earlier item is already about (the same
+      name, or the same volume and IG for xtremio_map) fail without changing anything"
+    - "Results are returned in the same format as a loop, one entry per item under results"
+
+options:
+    xms:
+        description:
+            - Hostname/IP address of XMS
+        required: true
+    username:
+        description:
+            - XMS Username
+        required: true
+    password:
+        description:
+            - XMS Password
+        required: true
+    module:
+        description:
+            - Module whose arguments the items hold
+        required: true
+        choices: ["xtremio_map", "xtremio_volume", "xtremio_ig", "xtremio_initiator"]
+    items:
+        description:
+            - List of items. Each is a dict of arguments of module, or a single value for the item_key argument.
+              Any other options given to this task (such as ig or state) are defaults for every item
+        required: true
+    item_key:
+        description:
+            - Argument of module that items which are not dicts are used as, for example volume for xtremio_map
+    max_workers:
+        description:
+            - Maximum number of items applied in parallel
+        default: 8
+
+extends_documentation_fragment:
+    - xtremio
+
+author:
+    - Scott Howard (@docbert)
+'''
+
+EXAMPLES = '''
+- name: Map snapshots to host, instead of looping over xtremio_map
+  xtremio_batch:
+    xms: xms.example.com
+    username: admin
+    password: Xtrem10
+    module: xtremio_map
+    ig: MyDev1-IG
+    state: present
+    item_key: volume
+    items:
+      - MyVol1.Dev1
+      - MyVol2.Dev1
+      - MyVol3.Dev1
+
+- name: Create volumes
+  xtremio_batch:
+    xms: xms.example.com
+    username: admin
+    password: Xtrem10
+    module: xtremio_volume
+    items:
+      - name: MyVol1
+        size: 100GB
+      - name: MyVol2
+        size: 1TB
+
+'''
+
+RETURN = '''
+results:
+    description: One result per item, in the order of items, each with item, changed, failed and msg (on failure)
+    returned: always
+    type: list
+'''
@@ -34,13 +34,30 @@ options:
         required: true
     volumes:
         description:
-            - List of volumes in Consistengy Group. Used when createing a new CG, or to modify the volumes in the CG
+            - List of volumes in Consistengy Group. Used when createing a new CG, or to modify the volumes in the CG.
+              If omitted for an existing CG its volumes are left alone
+    max_workers:
+        description:
+            - Maximum number of volumes added to or removed from the CG in parallel
+        default: 8
+    plan_file:
+        description:
+            - File to save the change plan to when running in check mode, or to read it from with apply_plan
+    apply_plan:
+        description:
+            - Apply the plan saved in plan_file by an earlier check mode run of this task instead of reading the CG again.
+              The CG is re-read first, and the task fails without changing anything if it changed since the plan was made
+        type: bool
+        default: false
     state:
         description:
             - Desired state of the Consistency Group
         required: true
         choices: ["present", "absent"]
 
+extends_documentation_fragment:
+    - xtremio
+
 author:
     - Scott Howard (@docbert)
 '''
@@ -81,11 +98,71 @@ EXAMPLES = '''
 '''
 
 RETURN = '''
+added:
+    description: Volumes added to the CG (including those it was created with)
+    returned: always
+    type: list
+removed:
+    description: Volumes removed from the CG
+    returned: always
+    type: list
+plan:
+    description: xtremio client calls made (or that would be made in check mode), each with action, type, name, call, args and kwargs
+    returned: always
+    type: list
 '''
 
 
-from ansible.module_utils.basic import AnsibleModule
-from xtremio import XtremIO
+from ansible.module_utils.xtremio_utils import XtremIOModule, XtremIOError
+from ansible.module_utils.xtremio_plan import Plan, params_fingerprint, execute_plan, saved_plan
+
+# The CG properties this module reads from the XMS. vol-list can be large,
+# so it is only requested when the membership is being managed
+CG_PROPS = ['name']
+CG_MEMBER_PROPS = ['name', 'vol-list']
+
+
+def members(steps, action):
+    """Volumes added to (action add, including at creation) or removed from the CG by steps"""
+    if action == 'add':
+        return [vol for step in steps if step['action'] == 'create' for vol in step['args'][1] or []] + \
+               [step['kwargs']['add'] for step in steps if step['action'] == 'add']
+    return [step['kwargs']['remove'] for step in steps if step['action'] == 'remove']
+
+
+def plan_cg(module, rest, name, volumes, state):
+    props = CG_MEMBER_PROPS if state == 'present' and volumes is not None else CG_PROPS
+    try:
+        cg = rest.get_object('consistency-groups', name, props)
+    except Exception as e:
+        raise XtremIOError('error accessing xms - ' + str(e))
+
+    plan = Plan('xtremio_cg', module.params['xms'], params_fingerprint(module.params))
+
+    if not cg:
+        if state == 'present':
+            plan.add('create', 'consistency-groups', name, 'create_cg', [name, volumes],
+                     after={'name': name, 'vol-list': sorted(volumes or [])})
+    else:
+        currentvol = sorted(vol[1] for vol in cg.get('vol-list', []))
+        before = {'name': name, 'vol-list': currentvol} if 'vol-list' in cg else {'name': name}
+        if state == 'absent':
+            plan.add('delete', 'consistency-groups', name, 'remove_cg', [name], before=before)
+        elif state == 'present' and volumes is not None:
+            after = {'name': name, 'vol-list': sorted(set(volumes))}
+            # The client adds and removes CG members one volume per call, so
+            # all of them (adds and removes together) are run in parallel
+            for vol in sorted(set(volumes) - set(currentvol)):
+                plan.add('add', 'consistency-groups', name, 'modify_cg', [name], {'add': vol},
+                         before=before, after=after)
+            for vol in sorted(set(currentvol) - set(volumes)):
+                plan.add('remove', 'consistency-groups', name, 'modify_cg', [name], {'remove': vol},
+                         before=before, after=after)
+
+    if plan.steps:
+        plan.observe('consistency-groups', {'name': name}, props, cg)
+    return plan
+
 
 def run_module():
     # define the available arguments/parameters that a user can pass to
@@ -96,70 +173,42 @@ def run_module():
         password=dict(type='str', required=True, no_log=True),
         name=dict(type='str', required=True),
         volumes=dict(type='list'),
+        max_workers=dict(type='int', default=8),
+        plan_file=dict(type='path'),
+        apply_plan=dict(type='bool', default=False),
         state=dict(type='str', default='present', choices=['absent', 'present']),
     )
 
-    module = AnsibleModule(
+    module = XtremIOModule(
         argument_spec=module_args,
         supports_check_mode=True
     )
 
-    xms = module.params['xms']
-    username = module.params['username']
-    password = module.params['password']
     name = module.params['name']
     volumes = module.params['volumes']
     state = module.params['state']
 
+    rest = module.rest()
     try:
-        xtremio = XtremIO(xms, username, password)
-        cg = xtremio.get_cg(name)
-    except Exception as e:
-        module.fail_json(msg='error accessing xms - ' + str(e))
+        if module.params['apply_plan']:
+            plan = saved_plan(module, 'xtremio_cg', module.params['xms'], rest)
+        else:
+            plan = plan_cg(module, rest, name, volumes, state)
+    except XtremIOError as e:
+        module.fail_json(msg=str(e), **e.result)
 
-    changed=False
+    result = dict(changed=bool(plan.steps), added=members(plan.steps, 'add'), removed=members(plan.steps, 'remove'))
+    result.update(plan.report(module))
 
-    if not cg:
-        if state == 'present':
-            if not module.check_mode:
-                try:
-                    xtremio.create_cg(name, volumes)
-                except Exception as e:
-                    module.fail_json(msg='error creating CG - ' + str(e))
-            changed=True
-    else:
-        if state == 'absent':
-            if not module.check_mode:
-                try:
-                    xtremio.remove_cg(name)
-                except Exception as e:
-                    module.fail_json(msg='error removing CG - ' + str(e))
-            changed=True
-        elif state == 'present':
-            currentvol = []
-            for vol in (cg['vol-list']):
-                currentvol.append(vol[1])
-
-            addvol=list(set(volumes)-set(currentvol))
-            delvol=list(set(currentvol)-set(volumes))
-
-            for vol in addvol:
-                if not module.check_mode:
-                    try:
-                        xtremio.modify_cg(name, add=vol)
-                    except Exception as e:
-                        module.fail_json(msg='error adding volume ' + vol + ' to CG - ' + str(e))
-                changed=True
-
-            for vol in delvol:
-                if not module.check_mode:
-                    try:
-                        xtremio.modify_cg(name, remove=vol)
-                    except Exception as e:
-                        module.fail_json(msg='error removing volume ' + vol + ' from CG - ' + str(e))
-                changed=True
-
-    module.exit_json(changed=changed)
+    try:
+        execute_plan(module, plan)
+    except XtremIOError as e:
+        applied = e.result.get('applied', [])
+        result.update(e.result)
+        result.update(changed=bool(applied), added=members(applied, 'add'), removed=members(applied, 'remove'))
+        module.fail_json(msg=str(e), **result)
+
+    module.exit_json(**result)
 
 
 def main():
@@ -0,0 +1,251 @@
+#!/usr/bin/python
+
+ANSIBLE_METADATA = {
+    'metadata_version': '1.1',
+    'status': ['preview'],
+    'supported_by': 'community'
+}
+
+DOCUMENTATION = '''
+---
+module: xtremio_cg_snapshot
+
+short_description: Dell EMC XtremIO snapshot a Consistency Group and map the snapshots
+
+description:
+    - "Create or refresh a Snapshot Set from a Consistency Group and map all of its snapshots to an Initiator Group on an XtremIO Array"
+    - "The snapshot names are read from the new Snapshot Set rather than built from the suffix, and the mappings are created in parallel"
+    - "If anything fails, mappings made by the run are removed again, as is the Snapshot Set if the run created it"
+
+options:
+    xms:
+        description:
+            - Hostname/IP address of XMS
+        required: true
+    username:
+        description:
+            - XMS Username
+        required: true
+    password:
+        description:
+            - XMS Password
+        required: true
+    cg:
+        description:
+            - Source Consistency Group
+        required: true
+    targetss:
+        description:
+            - Snapshot Set to create or refresh
+        required: true
+    suffix:
+        description:
+            - Suffix added to snapshot volume names when the Snapshot Set is created
+    ig:
+        description:
+            - Initiator Group to map the snapshots to
+        required: true
+    refresh:
+        description:
+            - If the Snapshot Set already exists, whether it should be refreshed from the CG or not
+        type: bool
+        default: false
+    rollback:
+        description:
+            - Undo the mappings made, and remove a Snapshot Set created by this run, if a later step fails.
+              A refresh can not be undone
+        type: bool
+        default: true
+    max_workers:
+        description:
+            - Maximum number of mappings created in parallel
+        default: 8
+    poll_timeout:
+        description:
+            - Number of seconds to wait for a new or refreshed Snapshot Set to appear on the XMS
+        default: 600
+
+extends_documentation_fragment:
+    - xtremio
+
+author:
+    - Scott Howard (@docbert)
+'''
+
+EXAMPLES = '''
+- name: Refresh the dev copy of MyCG1 and make sure all of it is mapped to MyDev1-IG
+  xtremio_cg_snapshot:
+    xms: xms.example.com
+    username: admin
+    password: Xtrem10
+    cg: MyCG1
+    targetss: MySnapSet1
+    suffix: Dev1
+    ig: MyDev1-IG
+    refresh: true
+
+'''
+
+RETURN = '''
+action:
+    description: What was done to the Snapshot Set, one of created, refreshed or none
+    returned: always
+    type: str
+volumes:
+    description: Snapshot volumes in the Snapshot Set (not known in check mode when the Snapshot Set would be created)
+    returned: always
+    type: list
+mapped:
+    description: Snapshot volumes newly mapped to the IG
+    returned: always
+    type: list
+rolled_back:
+    description: What was undone after a failure (unmapped volumes, and whether the Snapshot Set was removed)
+    returned: on failure, when rollback is true
+    type: dict
+'''
+
+from ansible.module_utils.xtremio_utils import XtremIOModule, XtremIOError, run_parallel, failed_items, wait_for
+from uuid import uuid4
+
+
+def snapshot_volumes(rest, ssname):
+    """Names of the volumes in snapshot set ssname, or None if it doesn't exist"""
+    ss = rest.get_object('snapshot-sets', ssname, ['name', 'vol-list'])
+    if not ss:
+        return None
+    return [vol[1] for vol in ss['vol-list']]
+
+
+def mapped_volumes(rest, ig):
+    params = [('full', 1), ('filter', 'ig-name:eq:' + ig), ('prop', 'vol-name')]
+    return set(m['vol-name'] for m in rest.get('lun-maps', params).get('lun-maps', []))
+
+
+def run_pipeline(module, xtremio, rest, cg, targetss, suffix, ig, refresh):
+    timeout = module.params['poll_timeout']
+    result = dict(action='none', volumes=[], mapped=[])
+    state = dict(created=False, refreshed=False)
+
+    try:
+        # Everything the pipeline needs to know up front, in one parallel round
+        lookups = run_parallel(lambda check: check(), [
+            lambda: rest.get_object('consistency-groups', cg, ['name']),
+            lambda: rest.get_object('initiator-groups', ig, ['name']),
+            lambda: snapshot_volumes(rest, targetss),
+        ], module.params['max_workers'])
+        failed = failed_items(lookups)
+        if failed:
+            raise failed[0][1]
+        cgexists, igexists, volumes = [found for check, found, error in lookups]
+    except Exception as e:
+        raise XtremIOError('error accessing xms - ' + str(e))
+
+    if not cgexists:
+        raise XtremIOError('Consistency Group ' + cg + ' does not exist')
+    if not igexists:
+        raise XtremIOError('Initiator Group ' + ig + ' does not exist')
+
+    try:
+        if volumes is None:
+            result['action'] = 'created'
+            if module.check_mode:
+                return result
+            xtremio.create_snapshot(cg=cg, ssname=targetss, suffix=suffix)
+            state['created'] = True
+            volumes = wait_for(lambda: snapshot_volumes(rest, targetss), timeout)
+        elif refresh:
+            result['action'] = 'refreshed'
+            if not module.check_mode:
+                # Refresh into a temporary snapshot set, then give it the
+                # target's name once it shows up
+                tmpuuid = str(uuid4())
+                xtremio.refresh_snapshot(fromcg=cg, toss=targetss, ss=tmpuuid)
+                state['refreshed'] = True
+                volumes = wait_for(lambda: snapshot_volumes(rest, tmpuuid), timeout)
+                xtremio.modify_snapshot_set(tmpuuid, name=targetss)
+        result['volumes'] = volumes
+
+        mapped = mapped_volumes(rest, ig)
+        todo = [vol for vol in volumes if vol not in mapped]
+    except Exception as e:
+        raise XtremIOError('error snapshotting CG - ' + str(e), **rollback(module, xtremio, targetss, ig, state, result))
+
+    if not module.check_mode:
+        results = run_parallel(lambda vol: xtremio.create_volume_mapping(vol, ig), todo, module.params['max_workers'])
+        result['mapped'] = [vol for vol, r, error in results if error is None]
+        failed = failed_items(results)
+        if failed:
+            raise XtremIOError('error mapping snapshots - ' + '; '.join(vol + ': ' + str(e) for vol, e in failed),
+                               **rollback(module, xtremio, targetss, ig, state, result))
+    else:
+        result['mapped'] = todo
+    return result
+
+
+def rollback(module, xtremio, targetss, ig, state, result):
+    """Undo what the run did so far, returning the result to fail with
+
+    The result is changed if anything the run did is left: a snapshot set
+    it created, mappings it made, or a refresh, which can't be undone.
+    """
+    result = dict(result)
+    created = state['created']
+    if module.params['rollback']:
+        undone = run_parallel(lambda vol: xtremio.remove_volume_mapping(vol, ig), result['mapped'],
+                              module.params['max_workers'])
+        rolled_back = dict(unmapped=[vol for vol, r, error in undone if error is None], removed_snapshot_set=False)
+        if created:
+            try:
+                xtremio.remove_snapshot_set(targetss)
+                rolled_back['removed_snapshot_set'] = True
+                created = False
+            except Exception:
+                pass
+        result['rolled_back'] = rolled_back
+        result['mapped'] = [vol for vol in result['mapped'] if vol not in rolled_back['unmapped']]
+    result['changed'] = created or state['refreshed'] or bool(result['mapped'])
+    return result
+
+
+def run_module():
+    # define the available arguments/parameters that a user can pass to
+    # the module
+    module_args = dict(
+        xms=dict(type='str', required=True),
+        username=dict(type='str', required=True),
+        password=dict(type='str', required=True, no_log=True),
+        cg=dict(type='str', required=True),
+        targetss=dict(type='str', required=True),
+        suffix=dict(type='str', required=False),
+        ig=dict(type='str', required=True),
+        refresh=dict(type='bool', default=False),
+        rollback=dict(type='bool', default=True),
+        max_workers=dict(type='int', default=8),
+        poll_timeout=dict(type='int', default=600),
+    )
+
+    module = XtremIOModule(
+        argument_spec=module_args,
+        supports_check_mode=True
+    )
+
+    try:
+        xtremio = module.client()
+    except Exception as e:
+        module.fail_json(msg='error accessing xms - ' + str(e))
+
+    try:
+        result = run_pipeline(module, xtremio, module.rest(), module.params['cg'], module.params['targetss'],
+                              module.params['suffix'], module.params['ig'], module.params['refresh'])
+    except XtremIOError as e:
+        module.fail_json(msg=str(e), **e.result)
+
+    module.exit_json(changed=result['action'] != 'none' or bool(result['mapped']), **result)
+
+
+def main():
+    run_module()
+
+if __name__ == '__main__':
+    main()
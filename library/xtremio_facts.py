@@ -0,0 +1,216 @@
+#!/usr/bin/python
+
+ANSIBLE_METADATA = {
+    'metadata_version': '1.1',
+    'status': ['preview'],
+    'supported_by': 'community'
+}
+
+DOCUMENTATION = '''
+---
+module: xtremio_facts
+
+short_description: Dell EMC XtremIO inventory facts
+
+description:
+    - "Collect volumes, snapshots, snapshot sets, consistency groups, initiator groups, initiators and mappings from an XtremIO Array"
+    - "Objects are returned as dictionaries indexed by name. Mappings are indexed by volume/IG"
+    - "The facts can be written to a local cache file which the other xtremio modules can read (facts_cache option) instead of querying the XMS themselves"
+    - "With incremental, an expired cache file is kept up to date from the XMS event log rather than read again in full"
+
+options:
+    xms:
+        description:
+            - Hostname/IP address of XMS
+        required: true
+    username:
+        description:
+            - XMS Username
+        required: true
+    password:
+        description:
+            - XMS Password
+        required: true
+    gather_subset:
+        description:
+            - Object types to collect
+        type: list
+        choices: ["volumes", "snapshots", "snapshot-sets", "consistency-groups", "initiator-groups", "initiators", "lun-maps"]
+        default: ["consistency-groups", "initiator-groups", "initiators", "lun-maps", "snapshot-sets", "snapshots", "volumes"]
+    cache_file:
+        description:
+            - Path of a local file to cache the facts in. If it holds unexpired facts for this XMS they are returned without querying the XMS
+    cache_ttl:
+        description:
+            - Number of seconds the cache file stays valid for
+        default: 300
+    refresh:
+        description:
+            - Ignore any existing cache file and query the XMS
+        type: bool
+        default: false
+    incremental:
+        description:
+            - Once cache_file has expired, bring it up to date from the XMS event log instead of reading every object again.
+              Only the objects named in the events since the last run, and the cached objects that refer to them, are looked up.
+              Everything is read again if the cache was last synced more than sync_max_age seconds ago or there were too many changes
+        type: bool
+        default: false
+    sync_max_age:
+        description:
+            - Maximum age in seconds of the last sync of cache_file for incremental to use it, as the XMS only keeps so many events
+        type: int
+        default: 86400
+    max_workers:
+        description:
+            - Maximum number of object types queried in parallel
+        default: 8
+
+extends_documentation_fragment:
+    - xtremio
+
+author:
+    - Scott Howard (@docbert)
+'''
+
+EXAMPLES = '''
+- name: Collect XtremIO facts and cache them for 10 minutes
+  xtremio_facts:
+    xms: xms.example.com
+    username: admin
+    password: Xtrem10
+    cache_file: /tmp/xms.example.com.json
+    cache_ttl: 600
+
+- name: Show the size of MyVol1
+  debug:
+    var: xtremio.volumes.MyVol1['vol-size']
+
+- name: Collect only volumes and mappings
+  xtremio_facts:
+    xms: xms.example.com
+    username: admin
+    password: Xtrem10
+    gather_subset:
+      - volumes
+      - lun-maps
+
+- name: Keep a cache of the array up to date from its event log, then reconcile volumes against it
+  xtremio_facts:
+    xms: xms.example.com
+    username: admin
+    password: Xtrem10
+    cache_file: /tmp/xms.example.com.json
+    cache_ttl: 300
+    incremental: true
+
+- xtremio_volume:
+    xms: xms.example.com
+    username: admin
+    password: Xtrem10
+    facts_cache: /tmp/xms.example.com.json
+    volumes: "{{ my_volumes }}"
+
+'''
+
+RETURN = '''
+ansible_facts:
+    description: Facts under the key xtremio, with one name-indexed dict per object type
+    returned: always
+    type: dict
+    sample:
+        xtremio:
+            volumes:
+                MyVol1: {"name": "MyVol1", "vol-size": "104857600"}
+            lun_maps:
+                MyVol1/MyIG1: {"vol-name": "MyVol1", "ig-name": "MyIG1", "lun": 1}
+synced:
+    description: Number of objects of each type read again to bring the cache up to date
+    returned: when the cache was synced incrementally
+    type: dict
+    sample: {"volumes": 2, "lun-maps": 1}
+'''
+
+from ansible.module_utils.xtremio_utils import (XtremIOModule, FACT_TYPES, index_facts, run_parallel, failed_items,
+                                                read_facts_cache, write_facts_cache)
+from ansible.module_utils.xtremio_sync import sync_point, sync_facts, read_synced_facts
+
+
+def run_module():
+    # define the available arguments/parameters that a user can pass to
+    # the module
+    module_args = dict(
+        xms=dict(type='str', required=True),
+        username=dict(type='str', required=True),
+        password=dict(type='str', required=True, no_log=True),
+        gather_subset=dict(type='list', default=sorted(FACT_TYPES), choices=sorted(FACT_TYPES)),
+        cache_file=dict(type='path'),
+        cache_ttl=dict(type='int', default=300),
+        refresh=dict(type='bool', default=False),
+        incremental=dict(type='bool', default=False),
+        sync_max_age=dict(type='int', default=86400),
+        max_workers=dict(type='int', default=8),
+    )
+
+    module = XtremIOModule(
+        argument_spec=module_args,
+        supports_check_mode=True
+    )
+
+    xms = module.params['xms']
+    subset = module.params['gather_subset']
+    cache_file = module.params['cache_file']
+
+    if cache_file and not module.params['refresh']:
+        facts = read_facts_cache(cache_file, xms)
+        if facts is not None and all(FACT_TYPES[t] in facts for t in subset):
+            module.exit_json(changed=False, cached=True,
+                             ansible_facts=dict(xtremio=dict((FACT_TYPES[t], facts[FACT_TYPES[t]]) for t in subset)))
+
+    rest = module.rest()
+    sync = None
+
+    if cache_file and module.params['incremental'] and not module.params['refresh']:
+        facts, point = read_synced_facts(cache_file, xms, module.params['sync_max_age'])
+        if facts is not None and all(FACT_TYPES[t] in facts for t in subset):
+            try:
+                sync, refreshed = sync_facts(rest, facts, point, module.params['max_workers'])
+            except Exception as e:
+                module.fail_json(msg='error accessing xms - ' + str(e))
+            if sync is not None:
+                try:
+                    write_facts_cache(cache_file, xms, facts, module.params['cache_ttl'], sync)
+                except Exception as e:
+                    module.fail_json(msg='error writing cache file - ' + str(e))
+                module.exit_json(changed=False, cached=True, synced=refreshed,
+                                 ansible_facts=dict(xtremio=dict((FACT_TYPES[t], facts[FACT_TYPES[t]]) for t in subset)))
+
+    if cache_file and module.params['incremental']:
+        # Taken before reading, so that nothing changed while reading is missed
+        try:
+            sync = sync_point(rest)
+        except Exception as e:
+            module.fail_json(msg='error reading xms events - ' + str(e))
+
+    results = run_parallel(lambda objtype: index_facts(objtype, rest.iter_objects(objtype)), subset,
+                           module.params['max_workers'])
+    failed = failed_items(results)
+    if failed:
+        module.fail_json(msg='error accessing xms - ' + str(failed[0][1]))
+
+    facts = dict((FACT_TYPES[objtype], objects) for objtype, objects, error in results)
+
+    if cache_file:
+        try:
+            write_facts_cache(cache_file, xms, facts, module.params['cache_ttl'], sync)
+        except Exception as e:
+            module.fail_json(msg='error writing cache file - ' + str(e))
+
+    module.exit_json(changed=False, cached=False, ansible_facts=dict(xtremio=facts))
+
+
+def main():
+    run_module()
+
+if __name__ == '__main__':
+    main()
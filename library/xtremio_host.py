@@ -0,0 +1,217 @@
+#!/usr/bin/python
+
+ANSIBLE_METADATA = {
+    'metadata_version': '1.1',
+    'status': ['preview'],
+    'supported_by': 'community'
+}
+
+DOCUMENTATION = '''
+---
+module: xtremio_host
+
+short_description: Dell EMC XtremIO whole-host provisioning
+
+description:
+    - "Create or update an Initiator Group, its Initiators, its Volumes and the mappings between them on an XtremIO Array in a single task"
+    - "The current state of the array is read once, and independent changes are made in parallel"
+
+options:
+    xms:
+        description:
+            - Hostname/IP address of XMS
+        required: true
+    username:
+        description:
+            - XMS Username
+        required: true
+    password:
+        description:
+            - XMS Password
+        required: true
+    name:
+        description:
+            - Initiator Group name of the host
+        required: true
+    os:
+        description:
+            - Default operating system for initiators that do not set their own
+        choices: ["linux", "esx", "windows", "solaris", "aix", "hpux", "other"]
+        default: linux
+    initiators:
+        description:
+            - List of initiators in the IG, each a dict with keys name, address (WWN or IQN) and optionally os
+    volumes:
+        description:
+            - List of volumes for the host, each a dict with keys name and size. Every volume is mapped to the IG
+    max_workers:
+        description:
+            - Maximum number of XMS requests sent in parallel
+        default: 8
+    facts_cache:
+        description:
+            - Cache file written by xtremio_facts. If it holds unexpired facts for this XMS, the current IGs, initiators, volumes and mappings are read from it instead of the XMS.
+              Only use this when nothing else changes the array between the facts run and this task
+
+extends_documentation_fragment:
+    - xtremio
+
+author:
+    - Scott Howard (@docbert)
+'''
+
+EXAMPLES = '''
+- name: Create a host with two HBAs and one volume mapped to it
+  xtremio_host:
+    xms: xms.example.com
+    username: admin
+    password: Xtrem10
+    name: MyHost-IG
+    os: linux
+    initiators:
+      - name: MyHost-hba1
+        address: 10:00:00:10:10:10:10:10
+      - name: MyHost-hba2
+        address: 10:00:00:10:10:10:10:20
+    volumes:
+      - name: MyHost-vol1
+        size: 50GB
+
+'''
+
+RETURN = '''
+actions:
+    description: Changes made (or that would be made in check mode), in the order they were applied. On failure, the changes
+                 that were made before it
+    returned: always
+    type: list
+'''
+
+from ansible.module_utils.xtremio_utils import (XtremIOModule, XtremIOError, OS_CHOICES, run_parallel, failed_items,
+                                                parse_size, index_by_name, list_objects, read_facts_cache)
+from ansible.module_utils.xtremio_plan import Plan
+from ansible.module_utils.xtremio_reconcile import (VOLUME_PROPS, LUN_MAP_PROPS, IG_PROPS, INITIATOR_PROPS, plan_volume,
+                                                    plan_mapping, plan_ig, check_initiator, plan_initiators)
+
+# How each kind of step is described in actions
+NOUNS = {
+    'initiator-groups': 'IG',
+    'volumes': 'volume',
+    'initiators': 'initiator',
+    'lun-maps': 'volume',
+}
+
+
+def describe(step):
+    if step['type'] == 'lun-maps':
+        return step['action'] + ' volume ' + step['args'][0]
+    return step['action'] + ' ' + NOUNS[step['type']] + ' ' + step['name']
+
+
+def run_module():
+    # define the available arguments/parameters that a user can pass to
+    # the module
+    module_args = dict(
+        xms=dict(type='str', required=True),
+        username=dict(type='str', required=True),
+        password=dict(type='str', required=True, no_log=True),
+        name=dict(type='str', required=True),
+        os=dict(type='str', default='linux', choices=OS_CHOICES),
+        initiators=dict(type='list', default=[]),
+        volumes=dict(type='list', default=[]),
+        max_workers=dict(type='int', default=8),
+        facts_cache=dict(type='path'),
+    )
+
+    module = XtremIOModule(
+        argument_spec=module_args,
+        supports_check_mode=True
+    )
+
+    xms = module.params['xms']
+    name = module.params['name']
+    defaultos = module.params['os']
+    initiators = module.params['initiators']
+    volumes = module.params['volumes']
+
+    for init in initiators:
+        if not isinstance(init, dict) or not init.get('name') or not init.get('address'):
+            module.fail_json(msg='each initiator must be a dict with a name and address')
+
+    volsizes = {}
+    for vol in volumes:
+        if not isinstance(vol, dict) or not vol.get('name'):
+            module.fail_json(msg='each volume must be a dict with a name')
+        size = vol.get('size')
+        if size:
+            size = parse_size(size)
+            if not size:
+                module.fail_json(msg='unable to parse size of volume ' + vol['name'])
+        volsizes[vol['name']] = size
+
+    # Read everything the host spec touches in one pass, keeping only the
+    # objects this host cares about as they stream in. Every initiator is
+    # kept, as an address this host wants may belong to any of them
+    queries = [
+        ('initiator-groups', IG_PROPS,
+         lambda objs: ([ig for ig in objs if ig['name'] == name] or [None])[0]),
+        ('initiators', INITIATOR_PROPS, index_by_name),
+        ('volumes', VOLUME_PROPS,
+         lambda objs: dict((v['name'], v) for v in objs if v['name'] in volsizes)),
+        ('lun-maps', LUN_MAP_PROPS,
+         lambda objs: set(m['vol-name'] for m in objs if m['ig-name'] == name)),
+    ]
+    try:
+        rest = module.rest()
+        cache = read_facts_cache(module.params['facts_cache'], xms) if module.params['facts_cache'] else None
+        results = run_parallel(lambda q: q[2](list_objects(rest, q[0], q[1], cache)), queries,
+                               module.params['max_workers'])
+    except Exception as e:
+        module.fail_json(msg='error accessing xms - ' + str(e))
+    failed = failed_items(results)
+    if failed:
+        module.fail_json(msg='error accessing xms - ' + str(failed[0][1]))
+    currentig, currentinits, currentvols, currentmaps = [result for q, result, error in results]
+
+    # Stage 0 is the IG and the volumes, which don't depend on each other.
+    # Initiators and mappings need the IG (and volumes) to exist, so come
+    # in stage 1 on, the initiators in as many stages as taking addresses
+    # over from each other needs
+    plan = Plan('xtremio_host', xms, None)
+    try:
+        plan_ig(plan, currentig, name, 'present')
+        for volname, size in volsizes.items():
+            plan_volume(plan, currentvols.get(volname), volname, size, 'present')
+        entries = [check_initiator(dict(name=init['name'], ig=name, os=init.get('os', defaultos),
+                                        address=init['address'], state='present'))
+                   for init in initiators]
+    except XtremIOError as e:
+        module.fail_json(msg=str(e), **e.result)
+    errors = plan_initiators(plan, currentinits, entries, False)
+    if errors:
+        module.fail_json(msg='; '.join(msg for names, msg in errors))
+    for volname in volsizes:
+        plan_mapping(plan, volname in currentmaps, volname, name, 'present', stage=1)
+
+    steps = sorted(plan.steps, key=lambda step: step['stage'])
+    if module.check_mode or not steps:
+        module.exit_json(changed=bool(steps), actions=[describe(step) for step in steps])
+
+    try:
+        xtremio = module.client()
+    except Exception as e:
+        module.fail_json(msg='error accessing xms - ' + str(e))
+    done, failed, skipped = plan.run(xtremio, module.params['max_workers'])
+    actions = [describe(step) for step in steps if step in done]
+    if failed:
+        module.fail_json(msg='error provisioning host - ' +
+                         '; '.join(describe(step) + ': ' + str(e) for step, e in failed),
+                         changed=bool(actions), actions=actions)
+    module.exit_json(changed=True, actions=actions)
+
+
+def main():
+    run_module()
+
+if __name__ == '__main__':
+    main()
@@ -18,7 +18,7 @@ description:
 options:
     xms:
         description:
-            - Hostname/IP address of XMS
+            - Hostname/IP address of XMS. A list of XMS applies the same change to every array concurrently
         required: true
     username:
         description:
@@ -38,6 +38,9 @@ options:
         required: true
         choices: ["present", "absent"]
 
+extends_documentation_fragment:
+    - xtremio
+
 author:
     - Scott Howard (@docbert)
 '''
@@ -59,64 +62,66 @@ EXAMPLES = '''
     name: MyIG1
     state: absent
 
+- name: Create the same IG on several arrays
+  xtremio_ig:
+    xms:
+      - xms1.example.com
+      - xms2.example.com
+    username: admin
+    password: Xtrem10
+    name: MyIG1
+    state: present
+
 '''
 
 RETURN = '''
+results:
+    description: One result per array (xms, changed, elapsed seconds, failed and msg)
+    returned: when xms is a list of more than one XMS
+    type: list
 '''
 
 
-from ansible.module_utils.basic import AnsibleModule
-from xtremio import XtremIO
+from ansible.module_utils.xtremio_utils import XtremIOModule, XtremIOError, run_on_arrays
+from ansible.module_utils.xtremio_plan import Plan
+from ansible.module_utils.xtremio_reconcile import IG_PROPS, plan_ig
+
+
+def reconcile_ig(module, xms, name, state):
+    try:
+        xtremio = module.client(xms)
+        ig = module.rest(xms).get_object('initiator-groups', name, IG_PROPS)
+    except Exception as e:
+        raise XtremIOError('error accessing xms - ' + str(e))
+
+    # Decided the same way as xtremio_batch items, then made with the client
+    plan = Plan('xtremio_ig', xms, None)
+    plan_ig(plan, ig, name, state)
+    if plan.steps and not module.check_mode:
+        plan.apply(xtremio, 1)
+    return dict(changed=bool(plan.steps))
+
 
 def run_module():
     # define the available arguments/parameters that a user can pass to
     # the module
     module_args = dict(
-        xms=dict(type='str', required=True),
+        xms=dict(type='list', required=True),
         username=dict(type='str', required=True),
         password=dict(type='str', required=True, no_log=True),
         name=dict(type='str', required=True),
         state=dict(type='str', default='present', choices=['absent', 'present']),
     )
 
-    module = AnsibleModule(
+    module = XtremIOModule(
         argument_spec=module_args,
         supports_check_mode=True
     )
 
-    xms = module.params['xms']
-    username = module.params['username']
-    password = module.params['password']
     name = module.params['name']
     state = module.params['state']
 
-    try:
-        xtremio = XtremIO(xms, username, password)
-        ig = xtremio.get_ig(name)
-    except Exception as e:
-        module.fail_json(msg='error accessing xms - ' + str(e))
-
-    changed=False
-
-    if not ig:
-        if state == 'present':
-            if not module.check_mode:
-                try:
-                    xtremio.create_ig(name)
-                except Exception as e:
-                    module.fail_json(msg='error creating IG - ' + str(e))
-            changed=True
-    else:
-        if state == 'absent':
-            if ig['num-of-vols']>0:
-                module.fail_json(msg='can''t delete IG with volume mappings');
-            if not module.check_mode:
-                try:
-                    xtremio.remove_ig(name)
-                except Exception as e:
-                    module.fail_json(msg='error removing IG - ' + str(e))
-            changed=True
-    module.exit_json(changed=changed)
+    run_on_arrays(module, lambda xms: reconcile_ig(module, xms, name, state))
 
 
 def main():
@@ -30,25 +30,60 @@ options:
         required: true
     name:
         description:
-            - Initiator name
-        required: true
+            - Initiator name. One of name or initiators is required
     ig:
         description:
-            - Initiator Group the Initiator is in
-        required: true
+            - Initiator Group the Initiator is in. Required when state is present
     os:
         description:
             - Operating system of the initiator. Required when state is present
         choices: ["linux", "esx", "windows", "solaris", "aix", "hpux", "other"]
     address:
         description:
-            - WWN or IQN of the initiator. Required when state is present
+            - WWN or IQN of the initiator. Required when state is present.
+              WWNs may be written with colons, dashes or no separators at all and in either case; they are compared, and sent
+              to the XMS, as lowercase colon separated bytes
+    initiators:
+        description:
+            - List of initiators to manage in a single run, each a dict with keys name, address, and optionally ig, os and state
+              (defaulting to the ig, os and state options). Every initiator on the array is read once and indexed by name and
+              address, and only the required changes are made, with OS and address changes to one initiator made in one request.
+              Fails without changing anything if an address is listed twice or already belongs to another initiator, unless move is set.
+              An address taken from an initiator that is given a new one is only taken once that initiator has let go of it, but
+              initiators can't swap addresses in one run
+    move:
+        description:
+            - With initiators, remove an initiator whose address is given to another initiator in the list (an HBA that moved
+              host), and recreate initiators listed with a different IG than the one they are in
+        type: bool
+        default: false
+    max_workers:
+        description:
+            - Maximum number of XMS requests sent in parallel when initiators is used
+        default: 8
+    facts_cache:
+        description:
+            - Cache file written by xtremio_facts. If it holds unexpired facts for this XMS, the initiator list used with initiators is read from it instead of the XMS.
+              Only use this when nothing else changes the array between the facts run and this task
+    plan_file:
+        description:
+            - With initiators, file to save the change plan to when running in check mode, or to read it from with apply_plan
+    apply_plan:
+        description:
+            - With initiators, apply the plan saved in plan_file by an earlier check mode run of this task instead of reading the
+              initiators again. The initiators in the plan are re-read first, and the task fails without changing anything if
+              any of them changed since the plan was made
+        type: bool
+        default: false
     state:
         description:
             - Desired state of the volume
         required: true
         choices: ["present", "absent"]
 
+extends_documentation_fragment:
+    - xtremio
+
 author:
     - Scott Howard (@docbert)
 '''
@@ -83,14 +118,126 @@ EXAMPLES = '''
     address: 90:90:90:90:90:90:90:90
     state: present
 
+- name: Point the initiators of many hosts at their new WWNs after a fabric migration
+  xtremio_initiator:
+    xms: xms.example.com
+    username: admin
+    password: Xtrem10
+    os: linux
+    initiators:
+      - name: host1-hba1
+        ig: host1-IG
+        address: 2100001B32A1B2C3
+      - name: host1-hba2
+        ig: host1-IG
+        address: 21-00-00-1b-32-a1-b2-c4
+      - name: oldhost-hba1
+        state: absent
+    move: true
+    state: present
+
 '''
 
 RETURN = '''
+created:
+    description: Initiators created
+    returned: when initiators is used
+    type: list
+modified:
+    description: Initiators whose OS and/or address were changed
+    returned: when initiators is used
+    type: list
+moved:
+    description: Initiators recreated in a different IG
+    returned: when initiators is used
+    type: list
+removed:
+    description: Initiators removed, including those whose address was given to another initiator when move is set
+    returned: when initiators is used
+    type: list
+plan:
+    description: xtremio client calls made (or that would be made in check mode), each with action, type, name, call, args and kwargs
+    returned: when initiators is used
+    type: list
 '''
 
 
-from ansible.module_utils.basic import AnsibleModule
-from xtremio import XtremIO
+from ansible.module_utils.xtremio_utils import (XtremIOModule, XtremIOError, OS_CHOICES, normalize_address,
+                                                index_by_name, list_objects, read_facts_cache)
+from ansible.module_utils.xtremio_plan import Plan, params_fingerprint, execute_plan, saved_plan
+from ansible.module_utils.xtremio_reconcile import INITIATOR_PROPS, check_initiator, initiator_changes, plan_initiators
+
+
+def parse_initiators(module, initiators):
+    defaults = dict(ig=module.params['ig'], os=module.params['os'], state=module.params['state'])
+    desired = []
+    names = set()
+    addresses = {}
+    for entry in initiators:
+        if not isinstance(entry, dict) or not entry.get('name'):
+            module.fail_json(msg='each entry in initiators must be a dict with a name')
+        entry = dict(defaults, **entry)
+        name = entry['name']
+        if name in names:
+            module.fail_json(msg='initiator ' + name + ' is listed more than once')
+        names.add(name)
+        try:
+            entry = check_initiator(entry)
+        except XtremIOError as e:
+            module.fail_json(msg=str(e))
+        if entry['state'] == 'present':
+            address = entry['address']
+            if address in addresses:
+                module.fail_json(msg='address ' + address + ' is given for both ' + addresses[address] + ' and ' + name)
+            addresses[address] = name
+        desired.append(entry)
+    return desired
+
+
+def plan_bulk(module, rest, desired):
+    """Plan the initiator changes from one read of every initiator on the array"""
+    xms = module.params['xms']
+    try:
+        cache = read_facts_cache(module.params['facts_cache'], xms) if module.params['facts_cache'] else None
+        current = index_by_name(list_objects(rest, 'initiators', INITIATOR_PROPS, cache))
+    except Exception as e:
+        raise XtremIOError('error accessing xms - ' + str(e))
+
+    plan = Plan('xtremio_initiator', xms, params_fingerprint(module.params))
+    errors = plan_initiators(plan, current, desired, module.params['move'])
+    if errors:
+        raise XtremIOError('; '.join(msg for names, msg in errors))
+    return plan
+
+
+def run_bulk(module, desired):
+    rest = module.rest()
+    try:
+        if module.params['apply_plan']:
+            plan = saved_plan(module, 'xtremio_initiator', module.params['xms'], rest)
+        else:
+            plan = plan_bulk(module, rest, desired)
+    except XtremIOError as e:
+        module.fail_json(msg=str(e), **e.result)
+
+    # A delete followed by a create of the same name is a move to another IG
+    created = plan.names('create')
+    deleted = plan.names('delete')
+    result = dict(changed=bool(plan.steps),
+                  created=[name for name in created if name not in deleted],
+                  modified=plan.names('modify'),
+                  moved=[name for name in created if name in deleted],
+                  removed=[name for name in deleted if name not in created])
+    result.update(plan.report(module))
+
+    try:
+        execute_plan(module, plan)
+    except XtremIOError as e:
+        result.update(e.result)
+        module.fail_json(msg=str(e), **result)
+
+    module.exit_json(**result)
+
 
 def run_module():
     # define the available arguments/parameters that a user can pass to
@@ -99,46 +246,54 @@ def run_module():
         xms=dict(type='str', required=True),
         username=dict(type='str', required=True),
         password=dict(type='str', required=True, no_log=True),
-        name=dict(type='str', required=True),
-        ig=dict(type='str', required=True),
-        os=dict(type='str', choices=['linux', 'esx', 'windows', 'solaris', 'aix', 'hpux', 'other']),
+        name=dict(type='str', required=False),
+        ig=dict(type='str', required=False),
+        os=dict(type='str', choices=OS_CHOICES),
         address=dict(type='str'),
+        initiators=dict(type='list', required=False),
+        move=dict(type='bool', default=False),
+        max_workers=dict(type='int', default=8),
+        facts_cache=dict(type='path'),
+        plan_file=dict(type='path'),
+        apply_plan=dict(type='bool', default=False),
         state=dict(type='str', default='present', choices=['absent', 'present']),
     )
 
-    module = AnsibleModule(
+    module = XtremIOModule(
         argument_spec=module_args,
+        required_one_of=[['name', 'initiators']],
+        mutually_exclusive=[['name', 'initiators'], ['address', 'initiators']],
         supports_check_mode=True
     )
 
-    xms = module.params['xms']
-    username = module.params['username']
-    password = module.params['password']
     name = module.params['name']
     ig = module.params['ig']
     os = module.params['os']
     address = module.params['address']
     state = module.params['state']
+    initiators = module.params['initiators']
+
+    if initiators is not None:
+        run_bulk(module, parse_initiators(module, initiators))
 
     if state == 'present':
+        if not ig:
+            module.fail_json(msg='ig is required when state is "present"')
         if not os:
             module.fail_json(msg='os is required when state is "present"')
         if not address:
             module.fail_json(msg='address is required when state is "present"')
-
-    # Need to error-check the WWN format/etc
+        normalized = normalize_address(address)
+        if not normalized:
+            module.fail_json(msg='invalid WWN or IQN ' + address)
+        address = normalized
 
     try:
-        xtremio = XtremIO(xms, username, password)
-        initiator = xtremio.get_initiator(name)
+        xtremio = module.client()
+        initiator = module.rest().get_object('initiators', name, INITIATOR_PROPS)
     except Exception as e:
         module.fail_json(msg='error accessing xms - ' + str(e))
 
-    if initiator:
-        currentaddr = initiator['port-address']
-        currentos = initiator['operating-system']
-        currentig = initiator['ig-name']
-
     changed=False
     if not initiator:
         if state == 'present':
@@ -157,28 +312,22 @@ def run_module():
                     module.fail_json(msg='error removing initiator - ' + str(e))
             changed=True
         elif state == 'present':
-            if ig != currentig:
+            if ig != initiator['ig-name']:
                 module.fail_json(msg='Initiator exists and can not be moved between IGs')
-            if not os == currentos:
-                if not module.check_mode:
-                    try:
-                        xtremio.modify_initiator(name, os=os)
-                    except Exception as e:
-                        module.fail_json(msg='error modifying initiator OS - ' + str(e))
-                changed=True
-
-            if not address == currentaddr:
+            changes = initiator_changes(initiator, address, os)
+            if changes:
+                # OS and address changes go to the XMS in a single request
                 if not module.check_mode:
                     try:
-                        xtremio.modify_initiator(name, address=address)
+                        xtremio.modify_initiator(name, os=changes.get('operating-system'),
+                                                 address=changes.get('port-address'))
                     except Exception as e:
-                        module.fail_json(msg='error modifying initiator OS - ' + str(e))
+                        module.fail_json(msg='error modifying initiator - ' + str(e))
                 changed=True
 
     module.exit_json(changed=changed)
 
 
-
 def main():
     run_module()
 
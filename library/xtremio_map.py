@@ -30,18 +30,45 @@ options:
         required: true
     ig:
         description:
-            - Initiator Group for mapping operation
-        required: true
+            - Initiator Group for mapping operation. One of ig or igs is required
+    igs:
+        description:
+            - List of Initiator Groups for mapping operation
     volume:
         description:
-            - Volume (or snapshot) to Map/unmap
-        required: true
+            - Volume (or snapshot) to Map/unmap. One of volume or volumes is required
+    volumes:
+        description:
+            - List of volumes (or snapshots) to Map/unmap. Every volume is mapped to/unmapped from every IG.
+              When lists are used the whole mapping table is read from the XMS once and only missing
+              (or, with state=absent, existing) mappings are changed
+    max_workers:
+        description:
+            - Maximum number of mappings created or removed in parallel when volumes or igs is used
+        default: 8
+    facts_cache:
+        description:
+            - Cache file written by xtremio_facts. If it holds unexpired facts for this XMS, the mapping table used with volumes/igs is read from it instead of the XMS.
+              Only use this when nothing else changes the array between the facts run and this task
+    plan_file:
+        description:
+            - When volumes or igs is used, file to save the change plan to when running in check mode, or to read it from with apply_plan
+    apply_plan:
+        description:
+            - When volumes or igs is used, apply the plan saved in plan_file by an earlier check mode run of this task instead of
+              reading the mapping table again. The mappings in the plan are re-read first, and the task fails without changing
+              anything if any of them changed since the plan was made
+        type: bool
+        default: false
     state:
         description:
             - Desired state of the mapping between volume and IG
         required: true
         choices: ["present", "absent"]
 
+extends_documentation_fragment:
+    - xtremio
+
 author:
     - Scott Howard (@docbert)
 '''
@@ -65,15 +92,93 @@ EXAMPLES = '''
     ig: MyIG1
     state: absent
 
+- name: Map several snapshots to all IGs of a cluster
+  xtremio_map:
+    xms: xms.example.com
+    username: admin
+    password: Xtrem10
+    volumes:
+      - MyVol1.Dev1
+      - MyVol2.Dev1
+    igs:
+      - MyNode1-IG
+      - MyNode2-IG
+    state: present
+
 '''
 
 RETURN = '''
+mapped:
+    description: Volume/IG pairs that were mapped
+    returned: when volumes or igs is used
+    type: list
+unmapped:
+    description: Volume/IG pairs that were unmapped
+    returned: when volumes or igs is used
+    type: list
+plan:
+    description: xtremio client calls made (or that would be made in check mode), each with action, type, name, call, args and kwargs
+    returned: when volumes or igs is used
+    type: list
 '''
 
 
 
-from ansible.module_utils.basic import AnsibleModule
-from xtremio import XtremIO
+from ansible.module_utils.xtremio_utils import XtremIOModule, XtremIOError, list_objects, read_facts_cache
+from ansible.module_utils.xtremio_plan import Plan, params_fingerprint, execute_plan, saved_plan
+from ansible.module_utils.xtremio_reconcile import LUN_MAP_PROPS, plan_mapping
+
+
+def plan_batch(module, rest, volumes, igs, state):
+    """Plan the mapping changes from one read of the mapping table"""
+    xms = module.params['xms']
+    try:
+        cache = read_facts_cache(module.params['facts_cache'], xms) if module.params['facts_cache'] else None
+        current = set((m['vol-name'], m['ig-name'])
+                      for m in list_objects(rest, 'lun-maps', LUN_MAP_PROPS, cache))
+    except Exception as e:
+        raise XtremIOError('error accessing xms - ' + str(e))
+
+    plan = Plan('xtremio_map', xms, params_fingerprint(module.params))
+    for vol in volumes:
+        for ig in igs:
+            plan_mapping(plan, (vol, ig) in current, vol, ig, state)
+            # so that a volume or IG listed twice isn't mapped twice
+            if state == 'present':
+                current.add((vol, ig))
+            else:
+                current.discard((vol, ig))
+    return plan
+
+
+def pairs(steps, action):
+    return [dict(volume=step['name'].split('/', 1)[0], ig=step['name'].split('/', 1)[1])
+            for step in steps if step['action'] == action]
+
+
+def run_batch(module, volumes, igs, state):
+    rest = module.rest()
+    try:
+        if module.params['apply_plan']:
+            plan = saved_plan(module, 'xtremio_map', module.params['xms'], rest)
+        else:
+            plan = plan_batch(module, rest, volumes, igs, state)
+    except XtremIOError as e:
+        module.fail_json(msg=str(e), **e.result)
+
+    result = dict(changed=bool(plan.steps), mapped=pairs(plan.steps, 'map'), unmapped=pairs(plan.steps, 'unmap'))
+    result.update(plan.report(module))
+
+    try:
+        execute_plan(module, plan)
+    except XtremIOError as e:
+        applied = e.result.get('applied', [])
+        result.update(e.result)
+        result.update(changed=bool(applied), mapped=pairs(applied, 'map'), unmapped=pairs(applied, 'unmap'))
+        module.fail_json(msg=str(e), **result)
+
+    module.exit_json(**result)
+
 
 def run_module():
     # define the available arguments/parameters that a user can pass to
@@ -82,25 +187,36 @@ def run_module():
         xms=dict(type='str', required=True),
         username=dict(type='str', required=True),
         password=dict(type='str', required=True, no_log=True),
-        ig=dict(type='str', required=True),
-        volume=dict(type='str', required=True),
+        ig=dict(type='str', required=False),
+        igs=dict(type='list', required=False),
+        volume=dict(type='str', required=False),
+        volumes=dict(type='list', required=False),
+        max_workers=dict(type='int', default=8),
+        facts_cache=dict(type='path'),
+        plan_file=dict(type='path'),
+        apply_plan=dict(type='bool', default=False),
         state=dict(type='str', default='present', choices=['absent', 'present']),
     )
 
-    module = AnsibleModule(
+    module = XtremIOModule(
         argument_spec=module_args,
+        required_one_of=[['ig', 'igs'], ['volume', 'volumes']],
+        mutually_exclusive=[['ig', 'igs'], ['volume', 'volumes']],
         supports_check_mode=True
     )
 
-    xms = module.params['xms']
-    username = module.params['username']
-    password = module.params['password']
     ig = module.params['ig']
+    igs = module.params['igs']
     volume = module.params['volume']
+    volumes = module.params['volumes']
     state = module.params['state']
 
+    if igs is not None or volumes is not None:
+        run_batch(module, volumes if volumes is not None else [volume],
+                  igs if igs is not None else [ig], state)
+
     try:
-        xtremio = XtremIO(xms, username, password)
+        xtremio = module.client()
         lunmap = xtremio.get_volume_mapping(volume, ig)
     except Exception as e:
         module.fail_json(msg='error accessing xms - ' + str(e))
@@ -31,6 +31,15 @@ options:
     sourcevol:
         description:
             - Source Volume when snapshotting/refreshing a single volume. Target must be a Volume ("targetvol")
+    sourcevols:
+        description:
+            - List of source Volumes to snapshot together, consistently, without putting them in a Consistency Group first.
+              Target must be a Snapshot Set ("targetss"). The snapshots are named after their source volume with suffix appended
+              (e.g. MyVol1.Dev1) by the one XMS call that takes them. Snapshot Sets taken this way can not be refreshed
+            - The xtremio client has no call that snapshots a list of volumes, so this is the one change made with a REST
+              request built by the module (a POST to snapshots with volume-list, snapshot-set-name and snap-suffix). That
+              request has not been checked against a real XMS, only against hacking/xms_simulator.py. Where that matters,
+              put the volumes in a Consistency Group and use sourcecg, or xtremio_cg_snapshot, instead
     sourcecg:
         description:
             - Source Consistency Group when snapshotting/refreshing a CG. Target must be a Snapshot Set ("targetss")
@@ -48,18 +57,47 @@ options:
             - Target Snapshot Set when snapshotting/refreshing a CG/SS.
     suffix:
         description:
-            - Suffix added to snapshot volume names when creating a snapshot from a CG or SS
+            - Suffix added to snapshot volume names when creating a snapshot from a CG, SS or sourcevols. Required with sourcevols
     refresh:
         description:
             - If the snapshot already exists, whether it should be refreshed or not
         choices: ["True", "False"]
         default: False
+    refreshes:
+        description:
+            - List of snapshot sets to create or refresh in parallel, each a dict with keys targetss, one of sourcecg or sourcess,
+              and optionally suffix. Existing snapshot sets are refreshed, missing ones are created.
+              Can not be combined with the other source/target options
+    max_workers:
+        description:
+            - Maximum number of refreshes, or snapshot set removals when prune is used, run in parallel
+        default: 8
+    poll_timeout:
+        description:
+            - Number of seconds to wait for each refreshed snapshot set to appear on the XMS when refreshes is used
+        default: 600
+    prune:
+        description:
+            - Shell-style pattern (e.g. C(hourly-*)) of snapshot sets to apply a retention rule to. The matching snapshot sets
+              are read in one query, sorted by creation time and the expired ones removed in parallel.
+              Requires state absent and at least one of keep or max_age, and can not be combined with the other source/target options
+    keep:
+        description:
+            - When pruning, the number of most recent matching snapshot sets that are always kept
+    max_age:
+        description:
+            - When pruning, remove matching snapshot sets older than this, as a number followed by s, m, h, d or w (e.g. C(36h)).
+              If keep is also set, only snapshot sets beyond the most recent keep are removed, so a snapshot set is kept if either rule keeps it.
+              Creation times are read as UTC, which is how the XMS reports them
     state:
         description:
             - Desired state of the snapshot
         required: true
         choices: ["present", "absent"]
 
+extends_documentation_fragment:
+    - xtremio
+
 author:
     - Scott Howard (@docbert)
 '''
@@ -96,6 +134,20 @@ EXAMPLES = '''
     refresh: true
     state: present
 
+- name: Refresh several dev/test copies at once
+  xtremio_snapshot:
+    xms: xms.example.com
+    username: admin
+    password: Xtrem10
+    refreshes:
+      - sourcecg: ProdCG1
+        targetss: DevSnapSet1
+        suffix: Dev1
+      - sourcecg: ProdCG2
+        targetss: DevSnapSet2
+        suffix: Dev1
+    state: present
+
 - name: Delete a snapshot set, including snapshots in it
   xtremio_snapshot:
     xms: xms.example.com
@@ -104,14 +156,165 @@ EXAMPLES = '''
     targetss: MySnapSet1
     state: absent
 
+- name: Snapshot three volumes consistently to MySnapSet1, as MyVol1.Dev1, MyVol2.Dev1 and MyVol3.Dev1
+  xtremio_snapshot:
+    xms: xms.example.com
+    username: admin
+    password: Xtrem10
+    sourcevols:
+      - MyVol1
+      - MyVol2
+      - MyVol3
+    targetss: MySnapSet1
+    suffix: Dev1
+    state: present
+
+- name: Remove hourly snapshot sets older than 2 days, but always keep the newest 24
+  xtremio_snapshot:
+    xms: xms.example.com
+    username: admin
+    password: Xtrem10
+    prune: hourly-*
+    keep: 24
+    max_age: 2d
+    state: absent
+
 '''
 
 RETURN = '''
+results:
+    description: One entry per snapshot set in refreshes, with its targetss, the action taken (created/refreshed) and elapsed seconds
+    returned: when refreshes is used
+    type: list
+pruned:
+    description: Names of the snapshot sets removed (or that would be removed, in check mode) by prune, oldest first
+    returned: when prune is used
+    type: list
+kept:
+    description: Names of the snapshot sets matching prune that were kept, oldest first
+    returned: when prune is used
+    type: list
 '''
 
-from ansible.module_utils.basic import AnsibleModule
-from xtremio import XtremIO
+from ansible.module_utils.xtremio_utils import XtremIOModule, run_parallel, failed_items, wait_for
 from uuid import uuid4
+import calendar
+import fnmatch
+import re
+import time
+
+AGE_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800}
+XMS_TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def age_to_seconds(age):
+    match = re.match(r'^\s*(\d+)\s*([smhdw]?)\s*$', str(age).lower())
+    if not match:
+        raise ValueError('invalid max_age ' + str(age))
+    return int(match.group(1)) * AGE_UNITS[match.group(2) or 's']
+
+
+def run_refreshes(module, refreshes):
+    timeout = module.params['poll_timeout']
+
+    for entry in refreshes:
+        if not isinstance(entry, dict) or not entry.get('targetss'):
+            module.fail_json(msg='each entry in refreshes must be a dict with a targetss')
+        if [entry.get('sourcecg'), entry.get('sourcess')].count(None) != 1:
+            module.fail_json(msg='exactly one of sourcecg or sourcess is required for ' + entry['targetss'])
+    targets = [entry['targetss'] for entry in refreshes]
+    duplicates = sorted(set(t for t in targets if targets.count(t) > 1))
+    if duplicates:
+        module.fail_json(msg='each targetss can only appear once in refreshes - ' + ', '.join(duplicates))
+
+    try:
+        xtremio = module.client()
+        rest = module.rest()
+        existing = set(ss['name'] for ss in rest.iter_objects('snapshot-sets', ['name']))
+    except Exception as e:
+        module.fail_json(msg='error accessing xms - ' + str(e))
+
+    def apply(entry):
+        start = time.time()
+        targetss = entry['targetss']
+        sourcecg = entry.get('sourcecg')
+        sourcess = entry.get('sourcess')
+        if targetss not in existing:
+            if not module.check_mode:
+                if sourcecg: xtremio.create_snapshot(cg=sourcecg, ssname=targetss, suffix=entry.get('suffix'))
+                if sourcess: xtremio.create_snapshot(ss=sourcess, ssname=targetss, suffix=entry.get('suffix'))
+            action = 'created'
+        else:
+            if not module.check_mode:
+                tmpuuid = str(uuid4())
+                if sourcecg: xtremio.refresh_snapshot(fromcg=sourcecg, toss=targetss, ss=tmpuuid)
+                if sourcess: xtremio.refresh_snapshot(fromss=sourcess, toss=targetss, ss=tmpuuid)
+                # The new snapshot set can take a moment to show up under its
+                # temporary name, so wait for it before renaming
+                wait_for(lambda: rest.get_object('snapshot-sets', tmpuuid, ['name']), timeout)
+                xtremio.modify_snapshot_set(tmpuuid, name=targetss)
+            action = 'refreshed'
+        return dict(targetss=targetss, action=action, elapsed=round(time.time() - start, 3))
+
+    results = run_parallel(apply, refreshes, module.params['max_workers'])
+    done = [result for entry, result, error in results if error is None]
+    changed = any(result['action'] in ('created', 'refreshed') for result in done)
+    failed = failed_items(results)
+    if failed:
+        module.fail_json(msg='error refreshing snapshots - ' +
+                         '; '.join(entry['targetss'] + ': ' + str(e) for entry, e in failed),
+                         changed=changed, results=done)
+
+    module.exit_json(changed=changed, results=done)
+
+
+def run_prune(module, pattern, keep, max_age):
+    if keep is None and max_age is None:
+        module.fail_json(msg='prune requires keep and/or max_age')
+    if keep is not None and keep < 0:
+        module.fail_json(msg='keep must not be negative')
+    try:
+        cutoff = time.time() - age_to_seconds(max_age) if max_age is not None else None
+    except ValueError as e:
+        module.fail_json(msg=str(e))
+
+    try:
+        sets = [dict(name=ss['name'], created=calendar.timegm(time.strptime(ss['creation-time'], XMS_TIME_FORMAT)))
+                for ss in module.rest().iter_objects('snapshot-sets', ['name', 'creation-time'])
+                if fnmatch.fnmatchcase(ss['name'], pattern)]
+    except Exception as e:
+        module.fail_json(msg='error accessing xms - ' + str(e))
+
+    # Newest first, so that the first keep of them are the ones retained
+    sets.sort(key=lambda ss: ss['created'], reverse=True)
+    expired = []
+    kept = []
+    for index, ss in enumerate(sets):
+        if (keep is not None and index < keep) or (cutoff is not None and ss['created'] >= cutoff):
+            kept.append(ss['name'])
+        else:
+            expired.append(ss['name'])
+    expired.reverse()
+    kept.reverse()
+
+    if module.check_mode or not expired:
+        module.exit_json(changed=bool(expired), pruned=expired, kept=kept)
+
+    try:
+        xtremio = module.client()
+    except Exception as e:
+        module.fail_json(msg='error accessing xms - ' + str(e))
+
+    results = run_parallel(xtremio.remove_snapshot_set, expired, module.params['max_workers'])
+    failed = failed_items(results)
+    pruned = [name for name, result, error in results if error is None]
+    if failed:
+        module.fail_json(msg='error removing snapshot sets - ' +
+                         '; '.join(name + ': ' + str(e) for name, e in failed),
+                         changed=bool(pruned), pruned=pruned, kept=kept)
+
+    module.exit_json(changed=True, pruned=pruned, kept=kept)
+
 
 def run_module():
     # define the available arguments/parameters that a user can pass to
@@ -121,6 +324,7 @@ def run_module():
         username=dict(type='str', required=True),
         password=dict(type='str', required=True, no_log=True),
         sourcevol=dict(type='str', required=False),
+        sourcevols=dict(type='list', required=False),
         sourcecg=dict(type='str', required=False),
         sourcess=dict(type='str', required=False),
         targetvol=dict(type='str', required=False),
@@ -128,18 +332,22 @@ def run_module():
         targetss=dict(type='str', required=False),
         suffix=dict(type='str', required=False),
         state=dict(type='str', default='present', choices=['absent', 'present']),
-	refresh=dict(type='bool', default=False)
+	refresh=dict(type='bool', default=False),
+        refreshes=dict(type='list', required=False),
+        max_workers=dict(type='int', default=8),
+        poll_timeout=dict(type='int', default=600),
+        prune=dict(type='str', required=False),
+        keep=dict(type='int', required=False),
+        max_age=dict(type='str', required=False),
     )
 
-    module = AnsibleModule(
+    module = XtremIOModule(
         argument_spec=module_args,
         supports_check_mode=True
     )
 
-    xms = module.params['xms']
-    username = module.params['username']
-    password = module.params['password']
     sourcevol = module.params['sourcevol']
+    sourcevols = module.params['sourcevols']
     sourcecg = module.params['sourcecg']
     sourcess = module.params['sourcess']
     targetvol = module.params['targetvol']
@@ -148,12 +356,28 @@ def run_module():
     suffix = module.params['suffix']
     state = module.params['state']
     refresh = module.params['refresh']
+    refreshes = module.params['refreshes']
+    prune = module.params['prune']
+
+    if prune is not None:
+        if [sourcevol, sourcevols, sourcecg, sourcess, targetvol, targetcg, targetss, refreshes].count(None) != 8:
+            module.fail_json(msg='prune can not be combined with the source/target options or refreshes')
+        if state != 'absent':
+            module.fail_json(msg='prune can only be used with state absent')
+        run_prune(module, prune, module.params['keep'], module.params['max_age'])
+
+    if refreshes is not None:
+        if [sourcevol, sourcevols, sourcecg, sourcess, targetvol, targetcg, targetss].count(None) != 7:
+            module.fail_json(msg='refreshes can not be combined with the source/target options')
+        if state != 'present':
+            module.fail_json(msg='refreshes can only be used with state present')
+        run_refreshes(module, refreshes)
 
     if [targetvol, targetcg, targetss].count(None) != 2:
         module.fail_json(msg='exactly one of targetvol, targetss, targetcg is required')
 
-    if [sourcevol, sourcecg, sourcess].count(None) < 2:
-        module.fail_json(msg='no more than one of targetvol, targetss, targetcg can be set')
+    if [sourcevol, sourcevols, sourcecg, sourcess].count(None) < 3:
+        module.fail_json(msg='no more than one of sourcevol, sourcevols, sourcecg, sourcess can be set')
 
 
     if state == 'present':
@@ -161,14 +385,19 @@ def run_module():
             module.fail_json(msg='sourcevol must be specified when targetvol is used')
         elif targetcg and not sourcess:
             module.fail_json(msg='sourcess must be specified when targetcg is used')
-        elif targetss and not (sourcess or sourcecg):
-            module.fail_json(msg='one of sourcecg or sourcess must be specified when targetss is used')
+        elif targetss and not (sourcess or sourcecg or sourcevols):
+            module.fail_json(msg='one of sourcecg, sourcess or sourcevols must be specified when targetss is used')
+        elif sourcevols is not None and not (targetss and sourcevols):
+            module.fail_json(msg='sourcevols must be a non-empty list, and targetss must be used with it')
+        elif sourcevols and not suffix:
+            module.fail_json(msg='suffix must be specified when sourcevols is used')
 
     try:
-        xtremio = XtremIO(xms, username, password)
-        if targetvol: snap = xtremio.get_volume(targetvol)
-        if targetss: snap = xtremio.get_snapshot_set(targetss)
-        if targetcg: snap = xtremio.get_cg(targetcg)
+        xtremio = module.client()
+        rest = module.rest()
+        if targetvol: snap = rest.get_object('volumes', targetvol, ['name'])
+        if targetss: snap = rest.get_object('snapshot-sets', targetss, ['name'])
+        if targetcg: snap = rest.get_object('consistency-groups', targetcg, ['name'])
     except Exception as e:
         module.fail_json(msg='error accessing xms - ' + str(e))
 
@@ -182,6 +411,14 @@ def run_module():
                     if sourcevol: xtremio.create_snapshot(vol=sourcevol, suffix=tmpuuid)
                     if sourcecg:  xtremio.create_snapshot(cg=sourcecg, ssname=targetss, suffix=suffix)
                     if sourcess:  xtremio.create_snapshot(ss=sourcess, ssname=targetss, suffix=suffix)
+                    if sourcevols:
+                        # One call snapshots every volume and names the
+                        # snapshots, so nothing needs renaming afterwards.
+                        # The xtremio client can't snapshot a list of
+                        # volumes, so this body is the module's own and,
+                        # like the simulator's wire format, unverified
+                        body = {'volume-list': sourcevols, 'snapshot-set-name': targetss, 'snap-suffix': suffix}
+                        rest.request('POST', rest.path('snapshots'), body)
                 except Exception as e:
                     module.fail_json(msg='error creating snapshots - ' + str(e))
                 if sourcevol:
@@ -204,6 +441,8 @@ def run_module():
             changed=True
         elif state == 'present':
             if refresh:
+                if sourcevols:
+                    module.fail_json(msg='a snapshot set taken with sourcevols can not be refreshed, use a Consistency Group')
                 if not module.check_mode:
                     tmpuuid = str(uuid4())
                     try:
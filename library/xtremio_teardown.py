@@ -0,0 +1,286 @@
+#!/usr/bin/python
+
+ANSIBLE_METADATA = {
+    'metadata_version': '1.1',
+    'status': ['preview'],
+    'supported_by': 'community'
+}
+
+DOCUMENTATION = '''
+---
+module: xtremio_teardown
+
+short_description: Dell EMC XtremIO remove hosts, volumes, snapshot sets and CGs in dependency order
+
+description:
+    - "Remove Initiator Groups with their initiators and mappings, and volumes, snapshots, Snapshot Sets and Consistency Groups,
+      from an XtremIO Array"
+    - "Everything to remove is worked out from one read of the array. The removals are then made in levels, in parallel within each level:
+      mappings and initiators first, then volumes, snapshots and IGs, then Snapshot Sets, then Consistency Groups"
+    - "Objects that don't exist are ignored"
+
+options:
+    xms:
+        description:
+            - Hostname/IP address of XMS
+        required: true
+    username:
+        description:
+            - XMS Username
+        required: true
+    password:
+        description:
+            - XMS Password
+        required: true
+    igs:
+        description:
+            - Initiator Groups to remove, along with their initiators and mappings
+    volumes:
+        description:
+            - Volumes (or snapshots) to remove, after removing their mappings to any IG
+    delete_volumes:
+        description:
+            - Also remove the volumes mapped to igs that are not mapped to any other IG
+        type: bool
+        default: false
+    snapshot_sets:
+        description:
+            - Snapshot Sets to remove, along with their snapshots and the mappings of those
+    cgs:
+        description:
+            - Consistency Groups to remove. Their volumes are kept unless listed in volumes
+    max_workers:
+        description:
+            - Maximum number of removals made in parallel within a level
+        default: 8
+    facts_cache:
+        description:
+            - Cache file written by xtremio_facts. If it holds unexpired facts for this XMS, the objects to remove are worked out from it instead of the XMS.
+              Only use this when nothing else changes the array between the facts run and this task
+    plan_file:
+        description:
+            - File to save the change plan to when running in check mode, or to read it from with apply_plan
+    apply_plan:
+        description:
+            - Apply the plan saved in plan_file by an earlier check mode run of this task instead of reading the array again.
+              The objects in the plan are re-read first, and the task fails without changing anything if any of them changed since the plan was made
+        type: bool
+        default: false
+
+extends_documentation_fragment:
+    - xtremio
+
+author:
+    - Scott Howard (@docbert)
+'''
+
+EXAMPLES = '''
+- name: Decommission two hosts and the volumes only they used
+  xtremio_teardown:
+    xms: xms.example.com
+    username: admin
+    password: Xtrem10
+    igs:
+      - MyHost1-IG
+      - MyHost2-IG
+    delete_volumes: true
+
+- name: Remove a dev copy and the CG it was taken from
+  xtremio_teardown:
+    xms: xms.example.com
+    username: admin
+    password: Xtrem10
+    snapshot_sets:
+      - MySnapSet1
+    cgs:
+      - MyCG1
+
+'''
+
+RETURN = '''
+unmapped:
+    description: Volume/IG pairs that were unmapped
+    returned: always
+    type: list
+removed:
+    description: Names of the objects removed, by type (initiators, volumes, initiator_groups, snapshot_sets, consistency_groups)
+    returned: always
+    type: dict
+plan:
+    description: xtremio client calls made (or that would be made in check mode), each with action, type, name, call, args and kwargs
+    returned: always
+    type: list
+'''
+
+from ansible.module_utils.xtremio_utils import (XtremIOModule, XtremIOError, FACT_TYPES, list_objects, read_facts_cache,
+                                                run_parallel, failed_items)
+from ansible.module_utils.xtremio_plan import Plan, params_fingerprint, execute_plan, saved_plan
+
+# Properties read of each type
+TEARDOWN_PROPS = {
+    'lun-maps': ['vol-name', 'ig-name'],
+    'initiators': ['name', 'ig-name'],
+    'initiator-groups': ['name'],
+    'volumes': ['name'],
+    'snapshot-sets': ['name', 'vol-list'],
+    'consistency-groups': ['name'],
+}
+
+# Client call that removes an object of each type, by name
+REMOVE_CALLS = {
+    'initiators': 'remove_initiator',
+    'initiator-groups': 'remove_ig',
+    'volumes': 'remove_volume',
+    'snapshot-sets': 'remove_snapshot_set',
+    'consistency-groups': 'remove_cg',
+}
+
+# Level each type is removed at: an object can only go once nothing at an
+# earlier level refers to it any more
+TEARDOWN_STAGES = {
+    'lun-maps': 0,
+    'initiators': 0,
+    'volumes': 1,
+    'initiator-groups': 1,
+    'snapshot-sets': 2,
+    'consistency-groups': 3,
+}
+
+
+def read_state(module, rest, objtypes):
+    """The objects of objtypes, by type, from one parallel read of the array (or the facts cache)"""
+    xms = module.params['xms']
+    try:
+        cache = read_facts_cache(module.params['facts_cache'], xms) if module.params['facts_cache'] else None
+        results = run_parallel(lambda objtype: list(list_objects(rest, objtype, TEARDOWN_PROPS[objtype], cache)),
+                               objtypes, module.params['max_workers'])
+        failed = failed_items(results)
+        if failed:
+            raise failed[0][1]
+    except Exception as e:
+        raise XtremIOError('error accessing xms - ' + str(e))
+    return dict((objtype, objects) for objtype, objects, error in results)
+
+
+def plan_teardown(module, rest):
+    """Plan every removal from one read of the array"""
+    igs = set(module.params['igs'] or [])
+    volumes = set(module.params['volumes'] or [])
+    ssnames = set(module.params['snapshot_sets'] or [])
+    cgs = set(module.params['cgs'] or [])
+
+    objtypes = ['lun-maps']
+    if igs:
+        objtypes += ['initiators', 'initiator-groups']
+    if volumes or module.params['delete_volumes']:
+        objtypes.append('volumes')
+    if ssnames:
+        objtypes.append('snapshot-sets')
+    if cgs:
+        objtypes.append('consistency-groups')
+    state = read_state(module, rest, objtypes)
+
+    # Snapshots go along with their snapshot set, but are unmapped first
+    snapsets = [ss for ss in state.get('snapshot-sets', []) if ss['name'] in ssnames]
+    snapshots = set(vol[1] for ss in snapsets for vol in ss['vol-list'])
+    if module.params['delete_volumes']:
+        mapped = {}
+        for m in state['lun-maps']:
+            mapped.setdefault(m['vol-name'], set()).add(m['ig-name'])
+        volumes |= set(vol for vol, mapigs in mapped.items() if mapigs & igs and not mapigs - igs)
+
+    plan = Plan('xtremio_teardown', module.params['xms'], params_fingerprint(module.params))
+
+    def remove(objtype, obj):
+        name = obj['name']
+        plan.add('remove', objtype, name, REMOVE_CALLS[objtype], [name], before=obj, stage=TEARDOWN_STAGES[objtype])
+        plan.observe(objtype, {'name': name}, TEARDOWN_PROPS[objtype], obj)
+
+    for m in state['lun-maps']:
+        if m['ig-name'] in igs or m['vol-name'] in volumes or m['vol-name'] in snapshots:
+            lunmap = {'vol-name': m['vol-name'], 'ig-name': m['ig-name']}
+            plan.add('unmap', 'lun-maps', m['vol-name'] + '/' + m['ig-name'], 'remove_volume_mapping',
+                     [m['vol-name'], m['ig-name']], before=lunmap, stage=TEARDOWN_STAGES['lun-maps'])
+            plan.observe('lun-maps', lunmap, TEARDOWN_PROPS['lun-maps'], lunmap)
+    for init in state.get('initiators', []):
+        if init['ig-name'] in igs:
+            remove('initiators', init)
+    for vol in state.get('volumes', []):
+        if vol['name'] in volumes and vol['name'] not in snapshots:
+            remove('volumes', vol)
+    for ig in state.get('initiator-groups', []):
+        if ig['name'] in igs:
+            remove('initiator-groups', ig)
+    for ss in snapsets:
+        remove('snapshot-sets', ss)
+    for cg in state.get('consistency-groups', []):
+        if cg['name'] in cgs:
+            remove('consistency-groups', cg)
+    return plan
+
+
+def unmapped(steps):
+    return [dict(volume=step['name'].split('/', 1)[0], ig=step['name'].split('/', 1)[1])
+            for step in steps if step['action'] == 'unmap']
+
+
+def removed(steps):
+    result = dict((FACT_TYPES[objtype], []) for objtype in TEARDOWN_STAGES if objtype != 'lun-maps')
+    for step in steps:
+        if step['action'] == 'remove':
+            result[FACT_TYPES[step['type']]].append(step['name'])
+    return result
+
+
+def run_module():
+    # define the available arguments/parameters that a user can pass to
+    # the module
+    module_args = dict(
+        xms=dict(type='str', required=True),
+        username=dict(type='str', required=True),
+        password=dict(type='str', required=True, no_log=True),
+        igs=dict(type='list', required=False),
+        volumes=dict(type='list', required=False),
+        delete_volumes=dict(type='bool', default=False),
+        snapshot_sets=dict(type='list', required=False),
+        cgs=dict(type='list', required=False),
+        max_workers=dict(type='int', default=8),
+        facts_cache=dict(type='path'),
+        plan_file=dict(type='path'),
+        apply_plan=dict(type='bool', default=False),
+    )
+
+    module = XtremIOModule(
+        argument_spec=module_args,
+        required_one_of=[['igs', 'volumes', 'snapshot_sets', 'cgs']],
+        supports_check_mode=True
+    )
+
+    rest = module.rest()
+    try:
+        if module.params['apply_plan']:
+            plan = saved_plan(module, 'xtremio_teardown', module.params['xms'], rest)
+        else:
+            plan = plan_teardown(module, rest)
+    except XtremIOError as e:
+        module.fail_json(msg=str(e), **e.result)
+
+    result = dict(changed=bool(plan.steps), unmapped=unmapped(plan.steps), removed=removed(plan.steps))
+    result.update(plan.report(module))
+
+    try:
+        execute_plan(module, plan)
+    except XtremIOError as e:
+        applied = e.result.get('applied', [])
+        result.update(e.result)
+        result.update(changed=bool(applied), unmapped=unmapped(applied), removed=removed(applied))
+        module.fail_json(msg=str(e), **result)
+
+    module.exit_json(**result)
+
+
+def main():
+    run_module()
+
+if __name__ == '__main__':
+    main()
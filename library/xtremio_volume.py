@@ -18,7 +18,7 @@ description:
 options:
     xms:
         description:
-            - Hostname/IP address of XMS
+            - Hostname/IP address of XMS. A list of XMS applies the same change to every array concurrently
         required: true
     username:
         description:
@@ -30,17 +30,43 @@ options:
         required: true
     name:
         description:
-            - Volume name
-        required: true
+            - Volume name. One of name or volumes is required
     size:
         description:
-            - Size of volume. Required for new volume, or to resize an existing volume. Must be a number followed by one of B/KB/MB/GB/TB
+            - Size of volume. Required for new volume, or to resize an existing volume. Must be a number followed by one of B/KB/MB/GB/TB/PB
+              (or KiB/MiB/GiB/TiB/PiB, which mean the same, as units are powers of 1024). Rounded up to a multiple of 8KB
+    volumes:
+        description:
+            - List of volumes to manage in a single run, each a dict with keys name, size and (optionally) state.
+              The volume list is read from the XMS once and only the required changes are made.
+              Entries without a state use the value of the state option
+    max_workers:
+        description:
+            - Maximum number of XMS requests sent in parallel when applying changes in bulk mode
+        default: 8
+    facts_cache:
+        description:
+            - Cache file written by xtremio_facts. If it holds unexpired facts for this XMS, bulk mode reads the volume list from it instead of the XMS.
+              Only use this when nothing else changes the array between the facts run and this task
+    plan_file:
+        description:
+            - In bulk mode, file to save the change plan to when running in check mode, or to read it from with apply_plan
+    apply_plan:
+        description:
+            - In bulk mode, apply the plan saved in plan_file by an earlier check mode run of this task instead of reading the
+              volume list again. The volumes in the plan are re-read first, and the task fails without changing anything if
+              any of them changed since the plan was made
+        type: bool
+        default: false
     state:
         description:
             - Desired state of the volume
         required: true
         choices: ["present", "absent"]
 
+extends_documentation_fragment:
+    - xtremio
+
 author:
     - Scott Howard (@docbert)
 '''
@@ -72,61 +98,145 @@ EXAMPLES = '''
     name: MyVol1
     state: absent
 
+- name: Create the same volume on several arrays
+  xtremio_volume:
+    xms:
+      - xms1.example.com
+      - xms2.example.com
+    username: admin
+    password: Xtrem10
+    name: MyVol1
+    size: 100GB
+    state: present
+
+- name: Create, resize or delete many volumes at once
+  xtremio_volume:
+    xms: xms.example.com
+    username: admin
+    password: Xtrem10
+    volumes:
+      - name: MyVol1
+        size: 200GB
+      - name: MyVol2
+        size: 1TB
+      - name: MyOldVol
+        state: absent
+    state: present
+
+- name: Review the changes for a volume list, then apply exactly those
+  block:
+    - xtremio_volume:
+        xms: xms.example.com
+        username: admin
+        password: Xtrem10
+        volumes: "{{ my_volumes }}"
+        plan_file: /tmp/volumes.plan
+      check_mode: true
+      diff: true
+    - pause:
+        prompt: Apply the plan above?
+    - xtremio_volume:
+        xms: xms.example.com
+        username: admin
+        password: Xtrem10
+        volumes: "{{ my_volumes }}"
+        plan_file: /tmp/volumes.plan
+        apply_plan: true
+
 '''
 
 RETURN = '''
+results:
+    description: One result per array (xms, changed, elapsed seconds, failed, msg and the other return values)
+    returned: when xms is a list of more than one XMS
+    type: list
+created:
+    description: Volumes created (bulk mode only)
+    returned: when volumes is used
+    type: list
+resized:
+    description: Volumes resized (bulk mode only)
+    returned: when volumes is used
+    type: list
+deleted:
+    description: Volumes deleted (bulk mode only)
+    returned: when volumes is used
+    type: list
+plan:
+    description: xtremio client calls made (or that would be made in check mode), each with action, type, name, call, args and kwargs (bulk mode only)
+    returned: when volumes is used
+    type: list
 '''
 
-from ansible.module_utils.basic import AnsibleModule
-from xtremio import XtremIO
-from math import ceil
-import re
+from ansible.module_utils.xtremio_utils import (XtremIOModule, XtremIOError, index_by_name, parse_size, parse_sizes,
+                                                format_size, list_objects, read_facts_cache, run_on_arrays)
+from ansible.module_utils.xtremio_plan import Plan, params_fingerprint, execute_plan, saved_plan
+from ansible.module_utils.xtremio_reconcile import VOLUME_PROPS, plan_volume
 
-sizeunits = {"b": 1.0/8, "k": 1, "m": 1024, "g": 1048576, "t": 1073741824}
 
-def sizeToKB(size):
-    s=re.search('(?i)^([\d.]+) ?([bkmgt])b? *$', size)
-    if not s:
-        return None
-    size = float(s.group(1)) * sizeunits[str(s.group(2)).lower()]
-    size = int(ceil(size / 8.0)) * 8
-    return size
+def parse_volumes(module, volumes, state):
+    desired = []
+    seen = set()
+    for entry in volumes:
+        if not isinstance(entry, dict) or not entry.get('name'):
+            module.fail_json(msg='each entry in volumes must be a dict with a name')
+    # Bulk specs tend to repeat a handful of sizes, each is parsed once
+    sizes = parse_sizes([entry.get('size') or '' for entry in volumes])
+    for entry, size in zip(volumes, sizes):
+        name = entry['name']
+        if name in seen:
+            module.fail_json(msg='volume ' + name + ' is listed more than once')
+        seen.add(name)
+        volstate = entry.get('state', state)
+        if volstate not in ['present', 'absent']:
+            module.fail_json(msg='invalid state for volume ' + name)
+        if entry.get('size') and not size:
+            module.fail_json(msg='unable to parse size ' + str(entry['size']) + ' of volume ' + name)
+        desired.append((name, size, volstate))
+    return desired
 
 
-def run_module():
-    # define the available arguments/parameters that a user can pass to
-    # the module
-    module_args = dict(
-        xms=dict(type='str', required=True),
-        username=dict(type='str', required=True),
-        password=dict(type='str', required=True, no_log=True),
-        name=dict(type='str', required=True),
-        size=dict(type='str', required=False),
-        state=dict(type='str', default='present', choices=['absent', 'present']),
-    )
+def plan_bulk(module, xms, rest, desired):
+    """Plan the volume changes from one read of the volume list"""
+    try:
+        cache = read_facts_cache(module.params['facts_cache'], xms) if module.params['facts_cache'] else None
+        current = index_by_name(list_objects(rest, 'volumes', VOLUME_PROPS, cache))
+    except Exception as e:
+        raise XtremIOError('error accessing xms - ' + str(e))
 
-    module = AnsibleModule(
-        argument_spec=module_args,
-        supports_check_mode=True
-    )
+    plan = Plan('xtremio_volume', xms, params_fingerprint(module.params))
+    for name, size, volstate in desired:
+        plan_volume(plan, current.get(name), name, size, volstate)
+    return plan
 
-    xms = module.params['xms']
-    username = module.params['username']
-    password = module.params['password']
-    name = module.params['name']
-    size = module.params['size']
-    state = module.params['state']
 
-    if size:
-        size = sizeToKB(size)
-        if not size:
-            module.fail_json(msg='unable to parse volume size')
+def reconcile_bulk(module, xms, desired):
+    rest = module.rest(xms)
+    if module.params['apply_plan']:
+        plan = saved_plan(module, 'xtremio_volume', xms, rest)
+    else:
+        plan = plan_bulk(module, xms, rest, desired)
+
+    result = dict(changed=bool(plan.steps),
+                  created=plan.names('create'),
+                  resized=plan.names('resize'),
+                  deleted=plan.names('delete'))
+    result.update(plan.report(module))
+
+    try:
+        execute_plan(module, plan)
+    except XtremIOError as e:
+        e.result.update(result)
+        raise
+    return result
+
 
+def reconcile_volume(module, xms, name, size, state):
     try:
-        xtremio = XtremIO(xms, username, password)
-        vol = xtremio.get_volume(name)
+        xtremio = module.client(xms)
+        vol = module.rest(xms).get_object('volumes', name, VOLUME_PROPS)
     except Exception as e:
-        module.fail_json(msg='error accessing xms - ' + str(e))
+        raise XtremIOError('error accessing xms - ' + str(e))
 
     if not vol:
         volsize=-1
@@ -138,12 +248,12 @@ def run_module():
     if volsize<0:
         if state == 'present':
             if not size:
-                module.fail_json(msg='volume size not supplied')
+                raise XtremIOError('volume size not supplied')
             if not module.check_mode:
                 try:
                     xtremio.create_volume(name, size)
                 except Exception as e:
-                    module.fail_json(msg='error creating volume - ' + str(e))
+                    raise XtremIOError('error creating volume - ' + str(e))
             changed=True
     else:
         if state == 'absent':
@@ -151,21 +261,65 @@ def run_module():
                 try:
                     xtremio.remove_volume(name)
                 except Exception as e:
-                    module.fail_json(msg='error deleting volume - ' + str(e))
+                    raise XtremIOError('error deleting volume - ' + str(e))
             changed=True
         elif state == 'present':
             if size:
                 if volsize>size:
-                    module.fail_json(msg='Shrinking volume not supported')
+                    raise XtremIOError('Shrinking volume from ' + format_size(volsize) + ' to ' + format_size(size) +
+                                       ' not supported')
                 elif volsize<size:
                     if not module.check_mode:
                         try:
                             xtremio.modify_volume(name, size=size)
                         except Exception as e:
-                            module.fail_json(msg='error resizing volume - ' + str(e))
+                            raise XtremIOError('error resizing volume - ' + str(e))
                     changed=True
 
-    module.exit_json(changed=changed)
+    return dict(changed=changed)
+
+
+def run_module():
+    # define the available arguments/parameters that a user can pass to
+    # the module
+    module_args = dict(
+        xms=dict(type='list', required=True),
+        username=dict(type='str', required=True),
+        password=dict(type='str', required=True, no_log=True),
+        name=dict(type='str', required=False),
+        size=dict(type='str', required=False),
+        volumes=dict(type='list', required=False),
+        max_workers=dict(type='int', default=8),
+        facts_cache=dict(type='path'),
+        plan_file=dict(type='path'),
+        apply_plan=dict(type='bool', default=False),
+        state=dict(type='str', default='present', choices=['absent', 'present']),
+    )
+
+    module = XtremIOModule(
+        argument_spec=module_args,
+        required_one_of=[['name', 'volumes']],
+        mutually_exclusive=[['name', 'volumes'], ['size', 'volumes']],
+        supports_check_mode=True
+    )
+
+    name = module.params['name']
+    size = module.params['size']
+    volumes = module.params['volumes']
+    state = module.params['state']
+
+    if volumes is not None:
+        if (module.params['plan_file'] or module.params['apply_plan']) and len(module.params['xms']) > 1:
+            module.fail_json(msg='plan_file and apply_plan can only be used with a single XMS')
+        desired = parse_volumes(module, volumes, state)
+        run_on_arrays(module, lambda xms: reconcile_bulk(module, xms, desired))
+
+    if size:
+        size = parse_size(size)
+        if not size:
+            module.fail_json(msg='unable to parse volume size')
+
+    run_on_arrays(module, lambda xms: reconcile_volume(module, xms, name, size, state))
 
 
 def main():
@@ -0,0 +1,268 @@
+# Object cache shared by the XtremIO Ansible modules of a play.
+#
+# Tasks in a play often look up the same objects: xtremio_cg and then
+# xtremio_snapshot read the same CG, xtremio_ig and then xtremio_map the
+# same IG. With the object_cache option those lookups are answered from a
+# small file on the controller, one section per XMS, instead of the XMS.
+# Entries expire after object_cache_ttl seconds, the least recently used
+# are evicted beyond object_cache_size, and every write a module makes
+# updates (or drops) the entries it affects.
+#
+# Lookups that find nothing are not cached, as another tool may create the
+# object at any time. Objects a module deletes are remembered as missing
+# until they expire, like any other change, so changes made outside the
+# play's xtremio tasks only show up once the affected entries expire.
+
+import fcntl
+import json
+import os
+import threading
+import time
+
+from ansible.module_utils.six.moves.urllib.parse import urlparse, parse_qs
+
+# Properties set by a create request, by type: body key -> property
+CREATED_PROPS = {
+    'volumes': {'vol-name': 'name', 'vol-size': 'vol-size'},
+    'initiator-groups': {'ig-name': 'name'},
+    'initiators': {'initiator-name': 'name', 'ig-id': 'ig-name', 'port-address': 'port-address',
+                   'operating-system': 'operating-system'},
+}
+
+# Properties a newly created object starts with
+CREATED_DEFAULTS = {
+    'initiator-groups': {'num-of-vols': 0},
+}
+
+# Properties a modify request changes in place (anything else drops the entry)
+MODIFIED_PROPS = ('vol-size', 'port-address', 'operating-system')
+
+# Body keys that name the object a create request makes
+NAME_KEYS = ('vol-name', 'ig-name', 'initiator-name', 'consistency-group-name', 'snapshot-set-name')
+
+# Types whose cached entries a write to a type can make wrong, as the XMS
+# updates related objects (CG and snapshot set volume lists, IG mapping
+# counts, snapshots replaced by a refresh) behind the scenes
+SIDE_EFFECTS = {
+    'volumes': ('consistency-groups', 'snapshot-sets', 'initiator-groups'),
+    'snapshots': ('volumes', 'snapshot-sets', 'consistency-groups', 'initiator-groups'),
+    'snapshot-sets': ('volumes', 'consistency-groups', 'initiator-groups'),
+    'initiator-groups': ('initiators',),
+    'lun-maps': ('initiator-groups',),
+}
+
+
+def valid_entry(entry):
+    """Whether entry, read from a cache file, has the shape ObjectCache stores"""
+    return (isinstance(entry, dict) and
+            all(isinstance(entry.get(k), (int, float)) for k in ('time', 'used')) and
+            (entry.get('object') is None or isinstance(entry['object'], dict)) and
+            (entry.get('props') is None or isinstance(entry['props'], list)))
+
+
+class ObjectCache(object):
+    """LRU cache of XMS objects for one XMS, kept in a file between module runs
+
+    The file is read once when the cache is created. Changes are kept as a
+    journal and replayed onto the current file contents, under an exclusive
+    lock, by flush(), so that concurrent tasks don't lose each other's
+    updates.
+    """
+
+    def __init__(self, path, xms, ttl=60, size=1000):
+        self.path = path
+        self.xms = xms
+        self.ttl = ttl
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._journal = []
+        self._lock = threading.Lock()
+        self._entries = self._load().get(xms, {})
+
+    def _load(self, fd=None):
+        """The cache file's contents by XMS, leaving out anything that isn't a well-formed entry"""
+        try:
+            if fd is None:
+                with open(self.path) as f:
+                    fcntl.flock(f, fcntl.LOCK_SH)
+                    data = json.load(f)
+            else:
+                os.lseek(fd, 0, os.SEEK_SET)
+                data = b''
+                while True:
+                    chunk = os.read(fd, 65536)
+                    if not chunk:
+                        break
+                    data += chunk
+                data = json.loads(data.decode('utf-8')) if data else {}
+        except (IOError, OSError, ValueError):
+            return {}
+        if not isinstance(data, dict):
+            return {}
+        return dict((xms, dict((key, entry) for key, entry in entries.items() if valid_entry(entry)))
+                    for xms, entries in data.items() if isinstance(entries, dict))
+
+    def _set(self, key, entry):
+        with self._lock:
+            if entry is None:
+                self._entries.pop(key, None)
+            else:
+                self._entries[key] = entry
+            self._journal.append((key, entry))
+
+    def lookup(self, objtype, name, props=None):
+        """Return (True, object or None if it doesn't exist) on a hit, (False, None) otherwise
+
+        A hit needs a fresh entry holding every property in props (all of
+        them if props is None).
+        """
+        key = objtype + '/' + name
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry['time'] + self.ttl > time.time():
+                obj = entry['object']
+                if obj is None:
+                    self.hits += 1
+                    return True, None
+                if entry['props'] is None or (props is not None and set(props) <= set(entry['props'])):
+                    self.hits += 1
+                    entry = dict(entry, used=time.time())
+                    self._entries[key] = entry
+                    self._journal.append((key, entry))
+                    if props is None:
+                        return True, dict(obj)
+                    return True, dict((p, obj[p]) for p in props if p in obj)
+            self.misses += 1
+            return False, None
+
+    def store(self, objtype, name, props, obj):
+        """Cache obj (None once it has been deleted), as read with props (None for every property)"""
+        now = time.time()
+        self._set(objtype + '/' + name, dict(object=obj, props=list(props) if props else None, time=now, used=now))
+
+    def invalidate(self, objtype, name=None):
+        """Drop the entry for name, or every entry of objtype"""
+        if name is not None:
+            self._set(objtype + '/' + name, None)
+            return
+        with self._lock:
+            keys = [key for key in self._entries if key.startswith(objtype + '/')]
+        for key in keys:
+            self._set(key, None)
+
+    def written(self, method, path, body=None):
+        """Update the cache after a successful POST/PUT/DELETE on path"""
+        url = urlparse(path)
+        objtype = url.path.rstrip('/').rsplit('/', 1)[-1]
+        query = parse_qs(url.query)
+        name = query.get('name', [None])[0]
+        body = body or {}
+
+        for other in SIDE_EFFECTS.get(objtype, ()):
+            self.invalidate(other)
+
+        if method == 'DELETE' and name:
+            self.store(objtype, name, None, None)
+        elif method == 'POST':
+            names = [body[k] for k in NAME_KEYS if body.get(k)]
+            if objtype in CREATED_PROPS and names:
+                obj = dict(CREATED_DEFAULTS.get(objtype, {}))
+                for key, prop in CREATED_PROPS[objtype].items():
+                    if key in body:
+                        obj[prop] = str(body[key]) if prop == 'vol-size' else body[key]
+                self.store(objtype, names[0], sorted(obj), obj)
+            else:
+                for created in names:
+                    self.invalidate(objtype, created)
+        elif method == 'PUT' and name:
+            key = objtype + '/' + name
+            with self._lock:
+                entry = self._entries.get(key)
+            if entry is None or entry['object'] is None or set(body) - set(MODIFIED_PROPS):
+                # Renames, CG membership changes and the like
+                self.invalidate(objtype, name)
+                for renamed in (body.get('name'), body.get('vol-name')):
+                    if renamed:
+                        self.invalidate(objtype, renamed)
+            else:
+                obj = dict(entry['object'])
+                obj.update(dict((k, str(v) if k == 'vol-size' else v) for k, v in body.items()))
+                self._set(key, dict(entry, object=obj, used=time.time()))
+
+    def stats(self):
+        return dict(hits=self.hits, misses=self.misses)
+
+    def flush(self):
+        """Merge this run's changes into the cache file, evicting the least recently used entries"""
+        if not self._journal:
+            return
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            data = self._load(fd)
+            entries = data.setdefault(self.xms, {})
+            for key, entry in self._journal:
+                if entry is None:
+                    entries.pop(key, None)
+                else:
+                    entries[key] = entry
+            now = time.time()
+            for key in [key for key, entry in entries.items() if entry['time'] + self.ttl <= now]:
+                del entries[key]
+            if len(entries) > self.size:
+                for key in sorted(entries, key=lambda k: entries[k]['used'])[:len(entries) - self.size]:
+                    del entries[key]
+            os.lseek(fd, 0, os.SEEK_SET)
+            os.ftruncate(fd, 0)
+            os.write(fd, json.dumps(data).encode('utf-8'))
+            self._journal = []
+        finally:
+            os.close(fd)
+
+
+# The REST request each xtremio client write amounts to, for ObjectCache.written()
+CLIENT_WRITES = {
+    'create_volume': lambda name, size: ('POST', 'volumes', None, {'vol-name': name, 'vol-size': size}),
+    'modify_volume': lambda volume, size=None, name=None: (
+        'PUT', 'volumes', volume, dict((k, v) for k, v in (('vol-size', size), ('vol-name', name)) if v)),
+    'remove_volume': lambda name: ('DELETE', 'volumes', name, None),
+    'create_cg': lambda name, *args, **kwargs: ('POST', 'consistency-groups', None, {'consistency-group-name': name}),
+    'modify_cg': lambda name, **kwargs: ('PUT', 'consistency-groups', name, {'vol-list': None}),
+    'remove_cg': lambda name: ('DELETE', 'consistency-groups', name, None),
+    'create_ig': lambda name: ('POST', 'initiator-groups', None, {'ig-name': name}),
+    'remove_ig': lambda name: ('DELETE', 'initiator-groups', name, None),
+    'create_initiator': lambda name, ig, address, os: (
+        'POST', 'initiators', None, {'initiator-name': name, 'ig-id': ig, 'port-address': address,
+                                     'operating-system': os}),
+    'modify_initiator': lambda name, os=None, address=None: (
+        'PUT', 'initiators', name, dict((k, v) for k, v in (('operating-system', os), ('port-address', address)) if v)),
+    'remove_initiator': lambda name: ('DELETE', 'initiators', name, None),
+    'create_volume_mapping': lambda volume, ig: ('POST', 'lun-maps', None, None),
+    'remove_volume_mapping': lambda volume, ig: ('DELETE', 'lun-maps', None, None),
+    'create_snapshot': lambda **kwargs: ('POST', 'snapshots', None, {'snapshot-set-name': kwargs.get('ssname')}),
+    'refresh_snapshot': lambda **kwargs: ('POST', 'snapshots', None, {'snapshot-set-name': kwargs.get('ss')}),
+    'modify_snapshot_set': lambda ssname, name=None: ('PUT', 'snapshot-sets', ssname, {'name': name}),
+    'remove_snapshot_set': lambda name: ('DELETE', 'snapshot-sets', name, None),
+}
+
+
+class CachingClient(object):
+    """Wraps an XtremIO client so that its writes keep an ObjectCache up to date"""
+
+    def __init__(self, client, cache):
+        self._client = client
+        self._cache = cache
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if name not in CLIENT_WRITES:
+            return attr
+
+        def write(*args, **kwargs):
+            result = attr(*args, **kwargs)
+            method, objtype, objname, body = CLIENT_WRITES[name](*args, **kwargs)
+            path = objtype + ('?name=' + objname if objname else '')
+            self._cache.written(method, path, body)
+            return result
+        return write
@@ -0,0 +1,106 @@
+# Timing of the XMS calls made by the XtremIO Ansible modules.
+#
+# Every XtremIO client call and XMS REST request made during a module run
+# is recorded in a CallRecorder, which can summarise them for the module
+# result or write them out as OpenTelemetry-style spans.
+
+import json
+import os
+import threading
+import time
+import uuid
+
+
+class CallRecorder(object):
+    """Thread-safe record of the XMS calls made during a module run"""
+
+    def __init__(self):
+        self.start = time.time()
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def record(self, kind, endpoint, start, end, status=None, size=None, error=None):
+        call = dict(kind=kind, endpoint=endpoint, start=start, duration=end - start,
+                    status=status, size=size, error=error)
+        with self._lock:
+            self.calls.append(call)
+
+    def summary(self):
+        """Totals for the run, and per endpoint"""
+        with self._lock:
+            calls = list(self.calls)
+        by_endpoint = {}
+        for call in calls:
+            entry = by_endpoint.setdefault(call['endpoint'], dict(count=0, errors=0, total=0.0, max=0.0, bytes=0))
+            entry['count'] += 1
+            entry['total'] += call['duration']
+            entry['max'] = max(entry['max'], call['duration'])
+            entry['bytes'] += call['size'] or 0
+            if call['error']:
+                entry['errors'] += 1
+        for entry in by_endpoint.values():
+            entry['total'] = round(entry['total'], 4)
+            entry['max'] = round(entry['max'], 4)
+        return dict(
+            elapsed=round(time.time() - self.start, 4),
+            calls=len(calls),
+            xms_time=round(sum(call['duration'] for call in calls), 4),
+            bytes=sum(call['size'] or 0 for call in calls),
+            by_endpoint=by_endpoint,
+        )
+
+    def write_spans(self, path, name):
+        """Append the run to path as JSON spans, one per line
+
+        The module run is the root span and every XMS call is a child of it.
+        Field names follow the OpenTelemetry span data model.
+        """
+        trace_id = uuid.uuid4().hex
+        root_id = uuid.uuid4().hex[:16]
+        end = time.time()
+        with self._lock:
+            calls = list(self.calls)
+
+        spans = [dict(traceId=trace_id, spanId=root_id, name=name, kind='INTERNAL',
+                      startTimeUnixNano=int(self.start * 1e9), endTimeUnixNano=int(end * 1e9),
+                      attributes={'xtremio.calls': len(calls)}, status=dict(code='OK'))]
+        for call in calls:
+            attributes = {'xtremio.kind': call['kind']}
+            if call['status'] is not None:
+                attributes['http.status_code' if call['kind'] == 'rest' else 'xtremio.status'] = call['status']
+            if call['size'] is not None:
+                attributes['http.response_content_length'] = call['size']
+            status = dict(code='ERROR', message=call['error']) if call['error'] else dict(code='OK')
+            spans.append(dict(traceId=trace_id, spanId=uuid.uuid4().hex[:16], parentSpanId=root_id,
+                              name=call['endpoint'], kind='CLIENT',
+                              startTimeUnixNano=int(call['start'] * 1e9),
+                              endTimeUnixNano=int((call['start'] + call['duration']) * 1e9),
+                              attributes=attributes, status=status))
+
+        with open(path, 'a') as f:
+            for span in spans:
+                f.write(json.dumps(span) + os.linesep)
+
+
+class InstrumentedClient(object):
+    """Wraps an XtremIO client, recording the time taken by every method call"""
+
+    def __init__(self, client, recorder):
+        self._client = client
+        self._recorder = recorder
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if not callable(attr):
+            return attr
+
+        def timed(*args, **kwargs):
+            start = time.time()
+            try:
+                result = attr(*args, **kwargs)
+            except Exception as e:
+                self._recorder.record('client', name, start, time.time(), status='error', error=str(e))
+                raise
+            self._recorder.record('client', name, start, time.time(), status='ok')
+            return result
+        return timed
@@ -0,0 +1,208 @@
+# Change plans for the XtremIO Ansible modules.
+#
+# A module reads the state it manages once, works out the xtremio client
+# calls that would bring the XMS to the desired state and collects them in
+# a Plan. Reads go through XMSRest, but changes are always made by the
+# client, the same calls the modules make outside of plans.
+# The plan is the check mode report (returned as plan and diff), can be
+# saved to a file, and can later be applied as is. Before applying a saved
+# plan only the objects it touches are re-read, limited to the properties
+# it was based on, to make sure nothing changed in between.
+
+import hashlib
+import json
+
+from ansible.module_utils.xtremio_utils import XtremIOError, run_parallel, failed_items, write_json_file
+
+PLAN_VERSION = 2
+
+# Up to this many observed objects of one type are re-read one by one when
+# checking for drift, beyond that a single listing of the type is cheaper
+DRIFT_LOOKUP_LIMIT = 20
+
+# Module options that don't change what a plan does
+UNPLANNED_OPTIONS = ('password', 'validate_certs', 'plan_file', 'apply_plan', 'max_workers', 'rate_limit', 'retries',
+                     'perf', 'perf_trace_file', 'facts_cache', 'object_cache', 'object_cache_ttl',
+                     'object_cache_size')
+
+
+def project(obj, props):
+    """obj limited to props, the way the XMS returns it for prop= queries"""
+    return dict((p, obj[p]) for p in props if p in obj)
+
+
+def step_report(step):
+    return dict((k, step[k]) for k in ('action', 'type', 'name', 'call', 'args', 'kwargs'))
+
+
+def params_fingerprint(params):
+    """Hash of the module parameters a plan was made for"""
+    planned = dict((k, v) for k, v in params.items() if k not in UNPLANNED_OPTIONS and not k.startswith('_'))
+    return hashlib.sha1(json.dumps(planned, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+class Plan(object):
+    """Client calls that bring one XMS to the desired state, and the state they were based on
+
+    Each step is one xtremio client call (method name, args and kwargs) with
+    the object it changes and its before/after properties for the diff.
+    Steps in the same stage don't depend on each other and are run in
+    parallel, stages are run in order.
+    """
+
+    def __init__(self, module, xms, fingerprint, steps=None, observed=None):
+        self.module = module
+        self.xms = xms
+        self.fingerprint = fingerprint
+        self.steps = steps or []
+        self.observed = observed or []
+
+    def add(self, action, objtype, name, call, args, kwargs=None, before=None, after=None, stage=0):
+        self.steps.append(dict(action=action, type=objtype, name=name, stage=stage,
+                               call=call, args=list(args), kwargs=kwargs or {}, before=before, after=after))
+
+    def observe(self, objtype, match, props, obj):
+        """Record obj (None if missing), the objtype matching match, as the plan saw it"""
+        self.observed.append(dict(type=objtype, match=match, props=props,
+                                  object=project(obj, props) if obj else None))
+
+    def names(self, action):
+        return [step['name'] for step in self.steps if step['action'] == action]
+
+    def diff(self):
+        before = {}
+        after = {}
+        for step in self.steps:
+            key = step['type'] + '/' + step['name']
+            if key not in before and step['before'] is not None:
+                before[key] = step['before']
+            if step['after'] is None:
+                after.pop(key, None)
+            else:
+                after[key] = step['after']
+        return dict(before=before, after=after)
+
+    def report(self, module):
+        """Result keys describing the plan, with diff if the run asked for it"""
+        result = dict(plan=[step_report(step) for step in self.steps])
+        if module._diff:
+            result['diff'] = self.diff()
+        return result
+
+    def to_dict(self):
+        return dict(version=PLAN_VERSION, module=self.module, xms=self.xms, fingerprint=self.fingerprint,
+                    steps=self.steps, observed=self.observed)
+
+    def save(self, path):
+        write_json_file(path, self.to_dict())
+
+    @classmethod
+    def load(cls, path, module, xms, fingerprint):
+        """Read a plan saved for module, xms and the same parameters"""
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (IOError, OSError, ValueError) as e:
+            raise XtremIOError('error reading plan file - ' + str(e))
+        if (not isinstance(data, dict) or data.get('version') != PLAN_VERSION or data.get('module') != module or
+                not isinstance(data.get('steps'), list) or not isinstance(data.get('observed'), list)):
+            raise XtremIOError('plan file ' + path + ' was not written by this module')
+        if data.get('xms') != xms:
+            raise XtremIOError('plan file ' + path + ' is for XMS ' + str(data.get('xms')))
+        if data.get('fingerprint') != fingerprint:
+            raise XtremIOError('plan file ' + path + ' was made with different parameters')
+        return cls(module, xms, fingerprint, data['steps'], data['observed'])
+
+    def drift(self, rest, max_workers):
+        """Names of the observed objects that changed since the plan was made"""
+        groups = {}
+        for obs in self.observed:
+            groups.setdefault((obs['type'], tuple(obs['props'])), []).append(obs)
+
+        def match_key(match):
+            return tuple(sorted(match.items()))
+
+        def check(group):
+            (objtype, props), observed = group
+            props = list(props)
+            if len(observed) <= DRIFT_LOOKUP_LIMIT:
+                current = {}
+                for obs in observed:
+                    params = [('full', 1)] + [('filter', '%s:eq:%s' % (k, v)) for k, v in sorted(obs['match'].items())]
+                    params += [('prop', p) for p in props]
+                    found = rest.get(objtype, params).get(objtype, [])
+                    if found:
+                        current[match_key(obs['match'])] = project(found[0], props)
+            else:
+                wanted = set(match_key(obs['match']) for obs in observed)
+                keys = sorted(observed[0]['match'])
+                current = {}
+                for obj in rest.iter_objects(objtype, sorted(set(props) | set(keys))):
+                    key = tuple((k, obj.get(k)) for k in keys)
+                    if key in wanted:
+                        current[key] = project(obj, props)
+            return [objtype + ' ' + '/'.join(str(v) for k, v in sorted(obs['match'].items()))
+                    for obs in observed if current.get(match_key(obs['match'])) != obs['object']]
+
+        results = run_parallel(check, sorted(groups.items()), max_workers)
+        failed = failed_items(results)
+        if failed:
+            raise XtremIOError('error checking plan against xms - ' + str(failed[0][1]))
+        return [name for group, changed, error in results for name in changed]
+
+    def run(self, client, max_workers):
+        """Run the steps through client stage by stage, stopping after the first stage with failures
+
+        Returns the steps done, the (step, exception) pairs that failed and
+        the steps of later stages that were not run.
+        """
+        done = []
+        stages = sorted(set(step['stage'] for step in self.steps))
+        for index, stage in enumerate(stages):
+            steps = [step for step in self.steps if step['stage'] == stage]
+            results = run_parallel(lambda step: getattr(client, step['call'])(*step['args'], **step['kwargs']),
+                                   steps, max_workers)
+            done += [step for step, result, error in results if error is None]
+            failed = failed_items(results)
+            if failed:
+                return done, failed, [step for step in self.steps if step['stage'] in stages[index + 1:]]
+        return done, [], []
+
+    def apply(self, client, max_workers):
+        """Run the steps through client stage by stage, raising XtremIOError on the first stage with failures"""
+        done, failed, skipped = self.run(client, max_workers)
+        if failed:
+            raise XtremIOError('error applying changes - ' +
+                               '; '.join('%s %s: %s' % (step['action'], step['name'], e) for step, e in failed),
+                               applied=[step_report(step) for step in done])
+        return done
+
+
+def execute_plan(module, plan):
+    """Save the plan in check mode if plan_file is set, otherwise apply it with the module's client"""
+    if module.check_mode:
+        if module.params.get('plan_file'):
+            try:
+                plan.save(module.params['plan_file'])
+            except Exception as e:
+                raise XtremIOError('error writing plan file - ' + str(e))
+        return
+    if not plan.steps:
+        return
+    try:
+        client = module.client(plan.xms)
+    except Exception as e:
+        raise XtremIOError('error accessing xms - ' + str(e))
+    plan.apply(client, module.params['max_workers'])
+
+
+def saved_plan(module, name, xms, rest):
+    """The plan from plan_file, provided nothing it touches has changed on the XMS"""
+    path = module.params['plan_file']
+    if not path:
+        raise XtremIOError('apply_plan requires plan_file')
+    plan = Plan.load(path, name, xms, params_fingerprint(module.params))
+    drifted = plan.drift(rest, module.params['max_workers'])
+    if drifted:
+        raise XtremIOError('the XMS changed since the plan was made, re-run in check mode - ' + ', '.join(drifted))
+    return plan
@@ -0,0 +1,200 @@
+# Planning of volume, mapping, IG and initiator changes, shared by the bulk
+# modes of the modules and the xtremio_batch action plugin so that both
+# decide the same way.
+#
+# Each plan_* function compares what is wanted for an object with what the
+# XMS has, adds the client calls that close the gap to a Plan and raises
+# XtremIOError if that can't be done. Reading the current state is left to
+# the caller, which reads every object of the type once up front.
+
+from ansible.module_utils.xtremio_utils import XtremIOError, OS_CHOICES, format_size, normalize_address
+from ansible.module_utils.xtremio_plan import project
+
+# The only properties read of each type
+VOLUME_PROPS = ['name', 'vol-size']
+LUN_MAP_PROPS = ['vol-name', 'ig-name']
+IG_PROPS = ['name', 'num-of-vols']
+INITIATOR_PROPS = ['name', 'port-address', 'operating-system', 'ig-name']
+
+
+def plan_volume(plan, vol, name, size, state):
+    """Plan volume name (currently vol, None if missing) to be state, with size KB if given"""
+    planned = len(plan.steps)
+    before = project(vol, VOLUME_PROPS) if vol else None
+    if state == 'absent':
+        if vol:
+            plan.add('delete', 'volumes', name, 'remove_volume', [name], before=before)
+    elif not vol:
+        if not size:
+            raise XtremIOError('volume size not supplied for ' + name)
+        plan.add('create', 'volumes', name, 'create_volume', [name, size],
+                 after={'name': name, 'vol-size': str(size)})
+    elif size:
+        volsize = int(vol['vol-size'])
+        if volsize>size:
+            raise XtremIOError('Shrinking volume ' + name + ' from ' + format_size(volsize) + ' to ' +
+                               format_size(size) + ' not supported')
+        elif volsize<size:
+            plan.add('resize', 'volumes', name, 'modify_volume', [name], {'size': size},
+                     before=before, after={'name': name, 'vol-size': str(size)})
+    if len(plan.steps) > planned:
+        plan.observe('volumes', {'name': name}, VOLUME_PROPS, vol)
+
+
+def plan_mapping(plan, mapped, volume, ig, state, stage=0):
+    """Plan the mapping of volume to ig (mapped now or not) to be state, in stage"""
+    lunmap = {'vol-name': volume, 'ig-name': ig}
+    if state == 'present' and not mapped:
+        plan.add('map', 'lun-maps', volume + '/' + ig, 'create_volume_mapping', [volume, ig], after=lunmap,
+                 stage=stage)
+        plan.observe('lun-maps', lunmap, LUN_MAP_PROPS, None)
+    elif state == 'absent' and mapped:
+        plan.add('unmap', 'lun-maps', volume + '/' + ig, 'remove_volume_mapping', [volume, ig], before=lunmap,
+                 stage=stage)
+        plan.observe('lun-maps', lunmap, LUN_MAP_PROPS, lunmap)
+
+
+def plan_ig(plan, ig, name, state):
+    """Plan IG name (currently ig, None if missing) to be state"""
+    if state == 'present' and not ig:
+        plan.add('create', 'initiator-groups', name, 'create_ig', [name], after={'name': name})
+    elif state == 'absent' and ig:
+        if ig['num-of-vols'] > 0:
+            raise XtremIOError("can't delete IG " + name + " with volume mappings")
+        plan.add('delete', 'initiator-groups', name, 'remove_ig', [name], before=project(ig, IG_PROPS))
+    else:
+        return
+    plan.observe('initiator-groups', {'name': name}, IG_PROPS, ig)
+
+
+def initiator_changes(current, address, os):
+    """Properties of an existing initiator to change, as one modify request body"""
+    changes = {}
+    if current['operating-system'] != os:
+        changes['operating-system'] = os
+    if (normalize_address(current['port-address']) or current['port-address']) != address:
+        changes['port-address'] = address
+    return changes
+
+
+def check_initiator(entry):
+    """Validate an initiator entry (name, ig, os, address and state), returning it with its address normalized"""
+    name = entry['name']
+    if entry.get('state') not in ('present', 'absent'):
+        raise XtremIOError('invalid state for initiator ' + name)
+    if entry['state'] == 'present':
+        if not entry.get('ig') or not entry.get('os') or not entry.get('address'):
+            raise XtremIOError('ig, os and address are required for initiator ' + name)
+        if entry['os'] not in OS_CHOICES:
+            raise XtremIOError('invalid os for initiator ' + name)
+        address = normalize_address(entry['address'])
+        if not address:
+            raise XtremIOError('invalid WWN or IQN ' + str(entry['address']) + ' for initiator ' + name)
+        entry = dict(entry, address=address)
+    return entry
+
+
+def plan_initiators(plan, current, desired, move):
+    """Plan the initiator changes for the checked entries desired, given every initiator on the array by name
+
+    Initiators are indexed by name and by normalized address, so an address
+    that already belongs to another initiator (a duplicate, or an HBA that
+    moved to another host) is found with one lookup. Returns the problems
+    found as a list of (names of the initiators involved, message), in
+    which case the plan is incomplete and must not be applied.
+    """
+    by_address = dict((normalize_address(init['port-address']) or init['port-address'], init)
+                      for init in current.values())
+
+    errors = []
+    removed = set()
+    readdressed = set()
+    pending = []
+
+    def remove(init):
+        if init['name'] not in removed:
+            removed.add(init['name'])
+            plan.add('delete', 'initiators', init['name'], 'remove_initiator', [init['name']],
+                     before=project(init, INITIATOR_PROPS))
+
+    for entry in desired:
+        name = entry['name']
+        init = current.get(name)
+        if entry['state'] == 'absent':
+            if init:
+                remove(init)
+            continue
+        if init and init['ig-name'] != entry['ig']:
+            if not move:
+                errors.append(([name], 'initiator ' + name + ' is in IG ' + init['ig-name'] +
+                               ' and can not be moved between IGs'))
+                continue
+            # The XMS can't move an initiator, so recreate it in the new IG
+            remove(init)
+            init = None
+        if init:
+            changes = initiator_changes(init, entry['address'], entry['os'])
+            if not changes:
+                continue
+            if 'port-address' in changes:
+                readdressed.add(name)
+        pending.append((entry, init))
+
+    # An address can only be taken once its current holder has let go of it,
+    # so a step waits for the modify that readdresses the holder
+    waits = {}
+    steps = []
+    for entry, init in pending:
+        name = entry['name']
+        holder = by_address.get(entry['address'])
+        if holder and holder['name'] != name and holder['name'] not in removed:
+            if holder['name'] in readdressed:
+                waits[name] = holder['name']
+            elif move:
+                remove(holder)
+            else:
+                errors.append(([name], 'address ' + entry['address'] + ' of initiator ' + name +
+                               ' already belongs to initiator ' + holder['name'] + ' in IG ' + holder['ig-name']))
+                continue
+        steps.append((entry, init))
+
+    # Each step runs one stage after the step it waits for, following the
+    # chain of waits back to a step that waits for nothing. A chain that
+    # comes back round to itself is initiators swapping addresses, which no
+    # order of modifies can do
+    stages = {}
+    for entry, init in steps:
+        name = entry['name']
+        chain = []
+        while name in waits and name not in stages and name not in chain:
+            chain.append(name)
+            name = waits[name]
+        if name in chain:
+            cycle = sorted(chain[chain.index(name):])
+            errors.append((cycle, 'initiators ' + ', '.join(cycle) + ' take each other\'s addresses, which can not '
+                                  'be done in one run - give one of them an unused address first'))
+            stage = None
+        else:
+            stage = stages.setdefault(name, 1)
+        for name in reversed(chain):
+            stage = stage + 1 if stage else None
+            stages[name] = stage
+
+    if errors:
+        return errors
+
+    for entry, init in steps:
+        name = entry['name']
+        after = {'name': name, 'port-address': entry['address'], 'operating-system': entry['os'], 'ig-name': entry['ig']}
+        if init:
+            changes = initiator_changes(init, entry['address'], entry['os'])
+            plan.add('modify', 'initiators', name, 'modify_initiator', [name],
+                     {'os': changes.get('operating-system'), 'address': changes.get('port-address')},
+                     before=project(init, INITIATOR_PROPS), after=after, stage=stages[name])
+        else:
+            plan.add('create', 'initiators', name, 'create_initiator', [name, entry['ig'], entry['address'], entry['os']],
+                     after=after, stage=stages[name])
+
+    for name in set(step['name'] for step in plan.steps):
+        plan.observe('initiators', {'name': name}, INITIATOR_PROPS, current.get(name))
+    return []
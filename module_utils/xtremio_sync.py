@@ -0,0 +1,237 @@
+# Incremental sync of the xtremio_facts cache from the XMS event log.
+#
+# The XMS logs an event for every object created, modified or removed. A
+# cache file that remembers the last event it has seen can be brought up
+# to date by reading the events since then and looking up again only the
+# objects they name, plus the cached objects that refer to those (the
+# mappings and CGs of a volume, the initiators of an IG, ...), instead of
+# reading every object on the array.
+
+import json
+import time
+
+from ansible.module_utils.xtremio_utils import FACT_TYPES, index_facts, lun_map_key, run_parallel, failed_items
+
+# XMS event entities, and the object types they name objects of. Snapshots
+# are volumes too, so either entity may name an object of either type
+EVENT_TYPES = {
+    'Volume': ('volumes', 'snapshots'),
+    'Snapshot': ('volumes', 'snapshots'),
+    'SnapshotSet': ('snapshot-sets',),
+    'ConsistencyGroup': ('consistency-groups',),
+    'InitiatorGroup': ('initiator-groups',),
+    'Initiator': ('initiators',),
+    'LunMap': ('lun-maps',),
+}
+
+XMS_EVENT_TIME = '%Y-%m-%d %H:%M:%S'
+
+# With no events logged at all, the first sync starts this many seconds
+# back (by the local clock, so allowing for the XMS clock being off)
+SYNC_START_WINDOW = 86400
+
+# More events than this since the last sync, and reading everything again
+# is cheaper
+SYNC_EVENT_LIMIT = 10000
+
+# Up to this many changed objects of one type are looked up one by one,
+# beyond that the type is listed again
+SYNC_LOOKUP_LIMIT = 50
+
+
+def iter_events(rest, since):
+    """Yield the XMS events logged since since (an XMS_EVENT_TIME string), a page at a time
+
+    The XMS lists events newest first. An event logged while paging pushes
+    the older ones down a place, so one may be yielded twice, never missed.
+    """
+    index = 0
+    while True:
+        params = [('from-date-time', since), ('limit', rest.page_size), ('from-index', index)]
+        page = rest.get('events', params).get('events', [])
+        for event in page:
+            yield event
+        if len(page) < rest.page_size:
+            return
+        index += len(page)
+
+
+def event_key(event):
+    """What tells event apart from the other events logged in the same second
+
+    Not every XMS version gives events an id, so the entity and the object
+    it names are part of it too.
+    """
+    return [event.get('timestamp'), event.get('id'), event.get('entity'), event.get('entity_details')]
+
+
+def advance(point, event):
+    """Move sync point point on past event
+
+    A point is the time of the newest event seen and the keys of the events
+    logged at that time, as from-date-time only has a resolution of a
+    second and returns them again.
+    """
+    when = event['timestamp'][:19]
+    if when > point['time']:
+        point['time'] = when
+        point['seen'] = []
+    if when == point['time']:
+        point['seen'].append(event_key(event))
+
+
+def sync_point(rest):
+    """Sync point to start from, taken before reading everything
+
+    Only the newest event is read. Other events logged in the same second
+    are read again by the next sync, which looks up the objects they name
+    once more for nothing.
+    """
+    point = dict(time=time.strftime(XMS_EVENT_TIME, time.localtime(time.time() - SYNC_START_WINDOW)), seen=[])
+    for event in rest.get('events', [('limit', 1)]).get('events', []):
+        point['time'] = event['timestamp'][:19]
+        advance(point, event)
+    point['synced'] = time.time()
+    return point
+
+
+def changes_since(rest, point):
+    """Return ({objtype: set of names} changed since point, new point), or (None, None) if there are too many"""
+    changes = {}
+    seen = set(tuple(key) for key in point['seen'])
+    point = dict(point, seen=list(point['seen']), synced=time.time())
+    count = 0
+    for event in iter_events(rest, point['time']):
+        if tuple(event_key(event)) in seen:
+            continue
+        seen.add(tuple(event_key(event)))
+        count += 1
+        if count > SYNC_EVENT_LIMIT:
+            return None, None
+        advance(point, event)
+        name = event.get('entity_details')
+        for objtype in EVENT_TYPES.get(event.get('entity'), ()):
+            if name:
+                changes.setdefault(objtype, set()).add(name)
+    return changes, point
+
+
+def add_related(facts, changes):
+    """Add the cached objects that refer to the changed ones to changes
+
+    Removing a volume removes its mappings and its place in CGs and
+    snapshot sets, mapping one changes its IG's volume count, and so on,
+    without the XMS logging an event for each of those.
+    """
+    def cached(objtype):
+        return facts.get(FACT_TYPES[objtype], {})
+
+    def add(objtype, name):
+        if FACT_TYPES[objtype] in facts:
+            changes.setdefault(objtype, set()).add(name)
+
+    volumes = changes.get('volumes', set()) | changes.get('snapshots', set())
+    igs = set(changes.get('initiator-groups', ()))
+    for key in list(changes.get('lun-maps', ())):
+        if '/' in key:
+            igs.add(key.split('/', 1)[1])
+    for key, lunmap in cached('lun-maps').items():
+        if lunmap['vol-name'] in volumes or lunmap['ig-name'] in igs:
+            add('lun-maps', key)
+            add('initiator-groups', lunmap['ig-name'])
+    for ig in igs:
+        add('initiator-groups', ig)
+    for objtype in ('consistency-groups', 'snapshot-sets'):
+        for name, obj in cached(objtype).items():
+            if any(vol[1] in volumes for vol in obj.get('vol-list', [])):
+                add(objtype, name)
+    for name, init in cached('initiators').items():
+        if init.get('ig-name') in igs:
+            add('initiators', name)
+
+
+def lookup(rest, objtype, name):
+    """The objects of objtype that name (a vol/ig key for lun-maps) stands for, now"""
+    if objtype == 'lun-maps':
+        volume, ig = name.split('/', 1)
+        params = [('full', 1), ('filter', 'vol-name:eq:' + volume), ('filter', 'ig-name:eq:' + ig)]
+    else:
+        params = [('full', 1), ('filter', 'name:eq:' + name)]
+    return rest.get(objtype, params).get(objtype, [])
+
+
+def apply_changes(rest, facts, changes, max_workers):
+    """Update the cached facts in place with the current state of the changed objects
+
+    Returns the number of objects looked up again, by type.
+    """
+    relist = []
+    lookups = []
+    for objtype, names in changes.items():
+        if FACT_TYPES[objtype] not in facts:
+            continue
+        if len(names) > SYNC_LOOKUP_LIMIT or (objtype == 'lun-maps' and any('/' not in n for n in names)):
+            relist.append(objtype)
+        else:
+            lookups += [(objtype, name) for name in sorted(names)]
+
+    results = run_parallel(lambda item: lookup(rest, *item), lookups, max_workers)
+    results += run_parallel(lambda objtype: index_facts(objtype, rest.iter_objects(objtype)), relist, max_workers)
+    failed = failed_items(results)
+    if failed:
+        raise failed[0][1]
+
+    refreshed = {}
+    for item, found, error in results:
+        if item in relist:
+            facts[FACT_TYPES[item]] = found
+            refreshed[item] = len(found)
+            continue
+        objtype, name = item
+        cached = facts[FACT_TYPES[objtype]]
+        cached.pop(name, None)
+        for obj in found:
+            key = lun_map_key(obj) if objtype == 'lun-maps' else obj['name']
+            # A renamed object turns up under its new name only, so drop
+            # whatever is cached under its old one
+            if 'index' in obj:
+                for stale in [k for k, o in cached.items() if o.get('index') == obj['index'] and k != key]:
+                    del cached[stale]
+            cached[key] = obj
+        refreshed[objtype] = refreshed.get(objtype, 0) + 1
+    return refreshed
+
+
+def sync_facts(rest, facts, point, max_workers):
+    """Bring facts read at sync point point up to date
+
+    Returns the new point and the number of objects looked up again by
+    type, or (None, None) if there were too many changes and everything
+    should be read again.
+    """
+    changes, point = changes_since(rest, point)
+    if changes is None:
+        return None, None
+    add_related(facts, changes)
+    return point, apply_changes(rest, facts, changes, max_workers)
+
+
+def read_synced_facts(path, xms, max_age):
+    """Return (facts, sync point) cached in path for xms, expired or not, or (None, None)
+
+    Caches synced more than max_age seconds ago aren't used, as the XMS
+    only keeps so many events.
+    """
+    try:
+        with open(path) as f:
+            cache = json.load(f)
+    except (IOError, OSError, ValueError):
+        return None, None
+    if not isinstance(cache, dict) or not isinstance(cache.get('facts'), dict):
+        return None, None
+    point = cache.get('sync')
+    if cache.get('xms') != xms or not isinstance(point, dict) or 'seen' not in point:
+        return None, None
+    if point.get('synced', 0) + max_age < time.time():
+        return None, None
+    return cache['facts'], point
@@ -0,0 +1,222 @@
+# Rate limiting, adaptive concurrency and retries for XMS calls.
+#
+# With many forks pointed at one XMS the server starts answering 429/503.
+# XMSThrottle spaces requests out with a token bucket shared by every
+# process on the host, caps the requests in flight with an AIMD limiter
+# and retries throttled calls, and idempotent calls that failed for other
+# reasons, with jittered exponential backoff.
+
+import fcntl
+import hashlib
+import json
+import os
+import random
+import socket
+import stat
+import tempfile
+import threading
+import time
+
+from ansible.module_utils.six.moves import http_client
+
+# HTTP statuses that mean the XMS is overloaded, and those worth retrying
+THROTTLE_STATUSES = (429, 503)
+RETRY_STATUSES = (429, 502, 503, 504)
+
+# The XMS rejects a request with 429 before acting on it, so even a write
+# can be sent again
+REJECTED_STATUS = 429
+
+
+def error_status(error):
+    """HTTP status carried by an exception from XMSRest or the xtremio client, if any"""
+    status = getattr(error, 'status', None)
+    if status is None:
+        status = getattr(getattr(error, 'response', None), 'status_code', None)
+    return status
+
+
+def state_dir():
+    """Return this user's private directory for throttle state, creating it if needed
+
+    The temp directory is shared with other users, so state files live in a
+    directory of our own that nobody else can plant files or symlinks in.
+    """
+    path = os.path.join(tempfile.gettempdir(), 'xtremio-%d' % os.getuid())
+    try:
+        os.mkdir(path, 0o700)
+    except OSError:
+        pass
+    st = os.lstat(path)
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid() or st.st_mode & 0o077:
+        raise OSError('%s is not a private directory owned by this user' % path)
+    return path
+
+
+class TokenBucket(object):
+    """Token bucket shared by every process on this host that talks to one XMS
+
+    The bucket state lives in a small file in this user's state_dir(),
+    updated under an exclusive flock, so concurrent Ansible forks share one
+    budget of rate requests per second.
+    """
+
+    def __init__(self, xms, rate, burst=None, path=None):
+        self.rate = float(rate)
+        self.burst = float(burst or max(1.0, self.rate))
+        if path is None:
+            path = os.path.join(state_dir(), '%s.bucket' % hashlib.sha1(xms.encode('utf-8')).hexdigest()[:16])
+        self.path = path
+
+    def acquire(self):
+        while True:
+            wait = self._take()
+            if not wait:
+                return
+            time.sleep(wait)
+
+    def _take(self):
+        """Take a token if one is available, otherwise return how long to wait"""
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT | os.O_NOFOLLOW, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            now = time.time()
+            try:
+                state = json.loads(os.read(fd, 1024).decode('utf-8'))
+                tokens = min(self.burst, state['tokens'] + (now - state['time']) * self.rate)
+            except (ValueError, KeyError, TypeError):
+                tokens = self.burst
+            wait = 0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / self.rate
+            os.lseek(fd, 0, os.SEEK_SET)
+            os.ftruncate(fd, 0)
+            os.write(fd, json.dumps(dict(tokens=tokens, time=now)).encode('utf-8'))
+            return wait
+        finally:
+            os.close(fd)
+
+
+class AdaptiveLimiter(object):
+    """Caps the number of XMS requests in flight, adapting the cap as it goes
+
+    Additive increase, multiplicative decrease: the cap halves whenever the
+    XMS throttles a request, shrinks by one when latency climbs well above
+    the best seen for the same endpoint, and otherwise grows by one per
+    cap's worth of successful requests, up to max_limit. Latency is compared
+    per endpoint as a bulk listing is always slower than a single lookup.
+    """
+
+    def __init__(self, max_limit, latency_factor=3.0):
+        self.max_limit = max(1, max_limit)
+        self.limit = float(self.max_limit)
+        self.latency_factor = latency_factor
+        self.in_flight = 0
+        self.best_latency = {}
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+
+    def release(self, latency, throttled=False, endpoint=None):
+        with self._cond:
+            self.in_flight -= 1
+            if throttled:
+                self.limit = max(1.0, self.limit / 2)
+            else:
+                best = self.best_latency.get(endpoint)
+                if best is None or latency < best:
+                    best = self.best_latency[endpoint] = latency
+                if latency > best * self.latency_factor and latency > 0.05:
+                    self.limit = max(1.0, self.limit - 1)
+                else:
+                    self.limit = min(float(self.max_limit), self.limit + 1.0 / self.limit)
+            self._cond.notify_all()
+
+
+class XMSThrottle(object):
+    """Everything between a module and one XMS: rate limit, concurrency cap and retries"""
+
+    def __init__(self, xms, rate_limit=0, retries=3, max_workers=8, backoff=0.5, max_backoff=30.0):
+        self.bucket = TokenBucket(xms, rate_limit) if rate_limit else None
+        self.limiter = AdaptiveLimiter(max_workers)
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.retried = 0
+        self.throttled = 0
+        self._lock = threading.Lock()
+
+    def retryable(self, error, idempotent):
+        """Whether a call that failed with error can be sent again
+
+        A 429 can always be retried. Anything else might have been acted on,
+        so only idempotent calls are retried.
+        """
+        status = error_status(error)
+        if status == REJECTED_STATUS:
+            return True
+        if not idempotent:
+            return False
+        if status is not None:
+            return status in RETRY_STATUSES
+        return isinstance(error, (socket.error, http_client.HTTPException))
+
+    def call(self, func, idempotent=False, endpoint=None):
+        """Run func() within the limits, retrying it on failure where that's safe
+
+        endpoint names what func() calls, for comparing latencies.
+        """
+        attempt = 0
+        while True:
+            if self.bucket is not None:
+                self.bucket.acquire()
+            self.limiter.acquire()
+            start = time.time()
+            try:
+                result = func()
+            except Exception as e:
+                throttled = error_status(e) in THROTTLE_STATUSES
+                self.limiter.release(time.time() - start, throttled, endpoint)
+                with self._lock:
+                    if throttled:
+                        self.throttled += 1
+                    if attempt < self.retries and self.retryable(e, idempotent):
+                        self.retried += 1
+                    else:
+                        raise
+                # Full jitter, so that throttled forks don't retry in lockstep
+                time.sleep(random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt)))
+                attempt += 1
+                continue
+            self.limiter.release(time.time() - start, endpoint=endpoint)
+            return result
+
+    def stats(self):
+        return dict(retries=self.retried, throttled=self.throttled, concurrency=int(self.limiter.limit))
+
+
+class ThrottledClient(object):
+    """Wraps an XtremIO client so every call goes through an XMSThrottle
+
+    Lookups (get_*) are treated as idempotent, so retried on any transient
+    error. Other calls are only retried when the XMS rejects them with 429.
+    """
+
+    def __init__(self, client, throttle):
+        self._client = client
+        self._throttle = throttle
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if not callable(attr):
+            return attr
+
+        def throttled(*args, **kwargs):
+            return self._throttle.call(lambda: attr(*args, **kwargs), idempotent=name.startswith('get_'), endpoint=name)
+        return throttled
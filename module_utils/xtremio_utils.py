@@ -0,0 +1,597 @@
+# Shared helpers for the XtremIO Ansible modules.
+#
+# The XtremIO client library only offers single-object lookups (get_volume,
+# get_ig, ...), so anything that needs to read many objects at once talks to
+# the XMS REST API directly through XMSRest.
+
+import base64
+import json
+import re
+import socket
+import os
+import ssl
+import tempfile
+import threading
+import time
+from multiprocessing.pool import ThreadPool
+
+from ansible.module_utils._text import to_bytes, to_text
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.six import string_types, integer_types
+from ansible.module_utils.six.moves import http_client
+from ansible.module_utils.six.moves.urllib.parse import urlencode, urlparse
+from ansible.module_utils.xtremio_perf import CallRecorder, InstrumentedClient
+from ansible.module_utils.xtremio_throttle import XMSThrottle, ThrottledClient
+from ansible.module_utils.xtremio_cache import ObjectCache, CachingClient
+
+try:
+    from xtremio import XtremIO
+    HAS_XTREMIO = True
+except ImportError:
+    HAS_XTREMIO = False
+
+XMS_API_PATH = '/api/json/v2/types/'
+
+# Default number of XMS requests a module keeps in flight at once
+DEFAULT_WORKERS = 8
+
+# Number of objects requested per page when listing
+DEFAULT_PAGE_SIZE = 1000
+
+# XMS object types collected by xtremio_facts, and the key each is stored
+# under in the facts (and the facts cache)
+FACT_TYPES = {
+    'volumes': 'volumes',
+    'snapshots': 'snapshots',
+    'snapshot-sets': 'snapshot_sets',
+    'consistency-groups': 'consistency_groups',
+    'initiator-groups': 'initiator_groups',
+    'initiators': 'initiators',
+    'lun-maps': 'lun_maps',
+}
+
+# Options every module accepts for pacing and timing its XMS calls
+COMMON_ARGUMENT_SPEC = dict(
+    validate_certs=dict(type='bool', default=True),
+    rate_limit=dict(type='float', default=0),
+    retries=dict(type='int', default=3),
+    perf=dict(type='bool', default=False),
+    perf_trace_file=dict(type='path'),
+    object_cache=dict(type='path'),
+    object_cache_ttl=dict(type='int', default=60),
+    object_cache_size=dict(type='int', default=1000),
+)
+
+# Volume sizes are allocated in blocks of this many KB
+BLOCK_KB = 8
+
+# Bytes per unit. As on the XMS, K/M/G/T/P are powers of 1024 whether they
+# are written SI style (GB) or IEC style (GiB)
+SIZE_UNITS = {'b': 1, 'k': 1 << 10, 'm': 1 << 20, 'g': 1 << 30, 't': 1 << 40, 'p': 1 << 50}
+SIZE_PATTERN = re.compile(r'^\s*(\d+)(?:\.(\d*))?\s*(?:([kmgtp])(?:i?b)?|(b))\s*$', re.IGNORECASE)
+
+
+def parse_size(size):
+    """Parse a size such as "100GB", "1.5TiB" or "512K" into KB
+
+    The result is exact (no floating point), rounded up to a whole number of
+    array blocks. Returns None if size can't be parsed.
+    """
+    s = SIZE_PATTERN.match(str(size))
+    if not s:
+        return None
+    whole, fraction, unit, byte = s.groups()
+    fraction = fraction or ''
+    scale = 10 ** len(fraction)
+    nbytes = int(whole + fraction) * SIZE_UNITS[(unit or byte).lower()]
+    # ceil(nbytes / scale / block size), in integer arithmetic
+    blocks = -(-nbytes // (scale * BLOCK_KB * 1024))
+    return blocks * BLOCK_KB
+
+
+def parse_sizes(sizes):
+    """parse_size() over a list, parsing each distinct size only once
+
+    Sizes that aren't strings or numbers (a list or dict from YAML) can't be
+    parsed, and come back as None like any other unparseable size.
+    """
+    parsed = {}
+    result = []
+    for size in sizes:
+        if not isinstance(size, string_types + integer_types):
+            result.append(None)
+            continue
+        if size not in parsed:
+            parsed[size] = parse_size(size)
+        result.append(parsed[size])
+    return result
+
+
+def format_size(kb):
+    """Format a size in KB with the largest unit it is a whole number of, such as 100GB"""
+    for unit in 'PTGM':
+        factor = SIZE_UNITS[unit.lower()] >> 10
+        if kb and kb % factor == 0:
+            return '%d%sB' % (kb // factor, unit)
+    return '%dKB' % kb
+
+
+# Operating systems the XMS accepts for initiators
+OS_CHOICES = ['linux', 'esx', 'windows', 'solaris', 'aix', 'hpux', 'other']
+
+WWN_SEPARATORS = re.compile(r'[:.\-\s]')
+WWN_HEX = re.compile(r'^(?:0x)?([0-9a-f]{16})$')
+ISCSI_NAME = re.compile(r'^(?:iqn\.\d{4}-\d{2}\.\S+|eui\.[0-9a-f]{16}|naa\.(?:[0-9a-f]{16}|[0-9a-f]{32}))$')
+
+
+def normalize_address(address):
+    """Canonical form of an initiator WWN or iSCSI name, or None if it is neither
+
+    WWNs are given as lowercase colon separated bytes whatever separators
+    (if any) they were written with, so 2100001B32A1B2C3 and
+    21-00-00-1b-32-a1-b2-c3 compare equal. iSCSI names are lowercased.
+    """
+    address = str(address).strip().lower()
+    if address.startswith(('iqn.', 'eui.', 'naa.')):
+        return address if ISCSI_NAME.match(address) else None
+    wwn = WWN_HEX.match(WWN_SEPARATORS.sub('', address))
+    if not wwn:
+        return None
+    return ':'.join(wwn.group(1)[i:i + 2] for i in range(0, 16, 2))
+
+
+class XtremIOError(Exception):
+    """A module failure, carrying any partial result to report with it"""
+
+    def __init__(self, msg, **result):
+        super(XtremIOError, self).__init__(msg)
+        self.result = result
+
+
+class XMSError(Exception):
+    """An XMS REST request returned an error status"""
+
+    def __init__(self, status, message):
+        super(XMSError, self).__init__('HTTP %d: %s' % (status, message))
+        self.status = status
+
+
+class XMSRest(object):
+    """Minimal client for the XMS JSON REST API (v2)
+
+    Each thread keeps one HTTPS keep-alive connection open to the XMS, so a
+    module run pays for the TCP/TLS handshake once per worker rather than
+    once per request.
+    """
+
+    def __init__(self, xms, username, password, validate_certs=True, timeout=60,
+                 page_size=DEFAULT_PAGE_SIZE, recorder=None, throttle=None, cache=None):
+        # xms is normally a bare hostname, but may carry a scheme and port
+        # (e.g. http://localhost:8443 for a local XMS simulator)
+        self.scheme = 'https'
+        if '://' in xms:
+            self.scheme, xms = xms.split('://', 1)
+        self.xms = xms.rstrip('/')
+        self.validate_certs = validate_certs
+        self.timeout = timeout
+        self.page_size = page_size
+        self.recorder = recorder
+        self.throttle = throttle
+        self.cache = cache
+        self._auth = 'Basic ' + to_text(base64.b64encode(to_bytes(username + ':' + password)))
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = []
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            if self.scheme == 'http':
+                conn = http_client.HTTPConnection(self.xms, timeout=self.timeout)
+            else:
+                if self.validate_certs:
+                    context = ssl.create_default_context()
+                else:
+                    context = ssl._create_unverified_context()
+                conn = http_client.HTTPSConnection(self.xms, timeout=self.timeout, context=context)
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def _drop_connection(self):
+        conn = self._local.conn
+        self._local.conn = None
+        conn.close()
+        with self._lock:
+            self._connections.remove(conn)
+
+    def close(self):
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections = []
+        self._local = threading.local()
+
+    def path(self, objtype, params=None):
+        path = XMS_API_PATH + objtype
+        if params:
+            path += '?' + urlencode(params, doseq=True)
+        return path
+
+    def request(self, method, path, body=None):
+        if self.throttle is None:
+            result = self._request(method, path, body)
+        else:
+            endpoint = method + ' ' + urlparse(path).path.replace(XMS_API_PATH, '', 1)
+            result = self.throttle.call(lambda: self._request(method, path, body), idempotent=method == 'GET',
+                                        endpoint=endpoint)
+        if self.cache is not None and method != 'GET':
+            self.cache.written(method, path, body)
+        return result
+
+    def _request(self, method, path, body=None):
+        headers = {'Authorization': self._auth, 'Accept': 'application/json'}
+        if body is not None:
+            body = json.dumps(body)
+            headers['Content-Type'] = 'application/json'
+
+        # The XMS closes idle keep-alive connections, so a request on a
+        # reused connection may fail before it is sent. Reconnect and retry
+        # once, but only for GETs which are safe to repeat.
+        retry = method == 'GET'
+        start = time.time()
+        while True:
+            conn = self._connection()
+            try:
+                conn.request(method, path, body, headers)
+                resp = conn.getresponse()
+                data = resp.read()
+                break
+            except (http_client.HTTPException, socket.error) as e:
+                self._drop_connection()
+                if not retry:
+                    self._record(method, path, start, error=str(e))
+                    raise
+                retry = False
+
+        if resp.status >= 400:
+            self._record(method, path, start, resp.status, len(data), to_text(data) or resp.reason)
+            raise XMSError(resp.status, to_text(data) or resp.reason)
+        self._record(method, path, start, resp.status, len(data))
+        if not data:
+            return {}
+        return json.loads(to_text(data))
+
+    def _record(self, method, path, start, status=None, size=None, error=None):
+        if self.recorder is not None:
+            endpoint = method + ' ' + urlparse(path).path.replace(XMS_API_PATH, '', 1)
+            self.recorder.record('rest', endpoint, start, time.time(), status, size, error)
+
+    def get(self, objtype, params=None):
+        return self.request('GET', self.path(objtype, params))
+
+    def get_object(self, objtype, name, props=None):
+        """Return the objtype called name, limited to props if given, or None if there isn't one
+
+        Modules should pass the few properties they actually use: a full
+        object can be large (a CG's vol-list, for one). With a cache, the
+        XMS is only asked if the cache has no fresh copy of the object, and
+        only objects that exist are cached.
+        """
+        if self.cache is not None:
+            hit, obj = self.cache.lookup(objtype, name, props)
+            if hit:
+                return obj
+        params = [('full', 1), ('filter', 'name:eq:' + name)]
+        if props:
+            params += [('prop', p) for p in props]
+        objects = self.get(objtype, params).get(objtype, [])
+        obj = objects[0] if objects else None
+        if self.cache is not None and obj is not None:
+            self.cache.store(objtype, name, props, obj)
+        return obj
+
+    def iter_objects(self, objtype, props=None):
+        """Yield every object of objtype, limited to props if given
+
+        Objects are requested page_size at a time (limit/from-index) and
+        yielded as each page arrives, so memory use is bounded by one page
+        however many objects the array holds. An XMS that ignores
+        from-index returns the same page again. The rest of the objects are
+        then read with one unpaged request, as stopping there would leave
+        the listing silently cut short.
+        """
+        index = 0
+        previous = None
+        props = [('prop', p) for p in props or ()]
+        while True:
+            params = [('full', 1), ('limit', self.page_size), ('from-index', index)]
+            page = self.get(objtype, params + props).get(objtype, [])
+            if not page:
+                return
+            if page == previous:
+                # If limit was ignored too, the first page held every object
+                # and nothing is left
+                for obj in self.get(objtype, [('full', 1)] + props).get(objtype, [])[index:]:
+                    yield obj
+                return
+            for obj in page:
+                yield obj
+            if len(page) < self.page_size:
+                return
+            previous = page
+            index += len(page)
+
+    def list(self, objtype, props=None):
+        """Return every object of objtype as a list. Prefer iter_objects()"""
+        return list(self.iter_objects(objtype, props))
+
+
+def xtremio_client(xms, username, password, throttle, recorder=None, cache=None):
+    """Log in to xms with the XtremIO client, wrapped so its calls go through throttle
+
+    The calls are also timed into recorder, and update cache, when those
+    are given.
+    """
+    if not HAS_XTREMIO:
+        raise XtremIOError('the xtremio python library is required for this module')
+    start = time.time()
+    client = ThrottledClient(XtremIO(xms, username, password), throttle)
+    if recorder is not None:
+        recorder.record('client', 'login', start, time.time(), status='ok')
+        client = InstrumentedClient(client, recorder)
+    if cache is not None:
+        client = CachingClient(client, cache)
+    return client
+
+
+class XtremIOModule(AnsibleModule):
+    """AnsibleModule that knows how to connect to the XMS
+
+    Every XMS call made through client() or rest() goes through an
+    XMSThrottle (rate_limit and retries options, concurrency capped at the
+    module's max_workers). When perf or perf_trace_file is set, the calls
+    are also timed, and the timings are added to the module result and/or
+    appended to the trace file. When object_cache is set, lookups by name
+    are answered from (and writes recorded in) an ObjectCache per XMS,
+    saved when the module exits.
+    """
+
+    def __init__(self, argument_spec, **kwargs):
+        spec = dict(COMMON_ARGUMENT_SPEC)
+        spec.update(argument_spec)
+        self.recorder = None
+        self._throttles = {}
+        self._caches = {}
+        self._clients = {}
+        super(XtremIOModule, self).__init__(argument_spec=spec, **kwargs)
+        if self.params['perf'] or self.params['perf_trace_file']:
+            self.recorder = CallRecorder()
+
+    def _xms(self, xms=None):
+        if xms:
+            return xms
+        xms = self.params['xms']
+        # Modules that fan out over several arrays take a list
+        if isinstance(xms, list):
+            return xms[0]
+        return xms
+
+    def throttle(self, xms=None):
+        """Return the XMSThrottle shared by all calls to xms"""
+        xms = self._xms(xms)
+        if xms not in self._throttles:
+            self._throttles[xms] = XMSThrottle(xms, self.params['rate_limit'], self.params['retries'],
+                                               self.params.get('max_workers') or DEFAULT_WORKERS)
+        return self._throttles[xms]
+
+    def object_cache(self, xms=None):
+        """Return the ObjectCache for xms, or None if object_cache isn't set"""
+        if not self.params['object_cache']:
+            return None
+        xms = self._xms(xms)
+        if xms not in self._caches:
+            self._caches[xms] = ObjectCache(self.params['object_cache'], xms, self.params['object_cache_ttl'],
+                                            self.params['object_cache_size'])
+        return self._caches[xms]
+
+    def client(self, xms=None):
+        """Return the XtremIO client for xms (by default the xms option)
+
+        The client manages its own session, which XMSRest's keep-alive
+        connections can't be shared with, so each run logs in once per XMS
+        and every later call for the same XMS reuses that client.
+        """
+        xms = self._xms(xms)
+        if xms not in self._clients:
+            self._clients[xms] = xtremio_client(xms, self.params['username'], self.params['password'],
+                                                self.throttle(xms), self.recorder, self.object_cache(xms))
+        return self._clients[xms]
+
+    def rest(self, xms=None):
+        """Return an XMSRest for xms (by default the xms option)"""
+        xms = self._xms(xms)
+        return XMSRest(xms, self.params['username'], self.params['password'],
+                       validate_certs=self.params['validate_certs'], recorder=self.recorder, throttle=self.throttle(xms), cache=self.object_cache(xms))
+
+    def _flush_caches(self, result):
+        for xms, cache in self._caches.items():
+            if self.params['perf']:
+                result.setdefault('perf', {}).setdefault('object_cache', {})[xms] = cache.stats()
+            try:
+                cache.flush()
+            except (IOError, OSError) as e:
+                self.warn('unable to write object cache - ' + str(e))
+
+    def _add_perf(self, result):
+        if self.recorder is None:
+            return
+        if self.params['perf']:
+            result['perf'] = self.recorder.summary()
+            result['perf']['throttle'] = dict((xms, t.stats()) for xms, t in self._throttles.items())
+        if self.params['perf_trace_file']:
+            try:
+                self.recorder.write_spans(self.params['perf_trace_file'], getattr(self, '_name', 'xtremio'))
+            except (IOError, OSError) as e:
+                self.warn('unable to write perf trace - ' + str(e))
+
+    def exit_json(self, **kwargs):
+        self._add_perf(kwargs)
+        self._flush_caches(kwargs)
+        super(XtremIOModule, self).exit_json(**kwargs)
+
+    def fail_json(self, **kwargs):
+        self._add_perf(kwargs)
+        self._flush_caches(kwargs)
+        super(XtremIOModule, self).fail_json(**kwargs)
+
+
+def run_on_arrays(module, reconcile):
+    """Run reconcile(xms) for every XMS in the xms option and exit the module
+
+    reconcile returns the module result for one array, or raises
+    XtremIOError. With a single XMS that result is the module result. With
+    several, all arrays are handled concurrently so a slow or unreachable one
+    doesn't hold up the rest, and each array's result is returned under
+    results along with its own timing.
+    """
+    arrays = module.params['xms']
+    if len(arrays) == 1:
+        try:
+            result = reconcile(arrays[0])
+        except XtremIOError as e:
+            module.fail_json(msg=str(e), **e.result)
+        module.exit_json(**result)
+
+    def run(xms):
+        start = time.time()
+        try:
+            result = reconcile(xms)
+            result['failed'] = False
+        except XtremIOError as e:
+            result = dict(e.result, failed=True, msg=str(e))
+        except Exception as e:
+            result = dict(failed=True, msg=str(e))
+        result.setdefault('changed', False)
+        result.update(xms=xms, elapsed=round(time.time() - start, 3))
+        return result
+
+    results = [result for xms, result, error in run_parallel(run, arrays, len(arrays))]
+    changed = any(result['changed'] for result in results)
+    failed = [result['xms'] for result in results if result['failed']]
+    if failed:
+        module.fail_json(msg='failed on ' + ', '.join(failed), changed=changed, results=results)
+    module.exit_json(changed=changed, results=results)
+
+
+def index_by_name(objects, key='name'):
+    """Turn a list of XMS objects into a dict keyed by name"""
+    return dict((obj[key], obj) for obj in objects)
+
+
+def lun_map_key(lunmap):
+    """Key lun-maps are indexed by, as they don't have a usable name"""
+    return lunmap['vol-name'] + '/' + lunmap['ig-name']
+
+
+def index_facts(objtype, objects):
+    if objtype == 'lun-maps':
+        return dict((lun_map_key(m), m) for m in objects)
+    return index_by_name(objects)
+
+
+def read_facts_cache(path, xms):
+    """Return the facts cached in path for xms, or None if missing or expired"""
+    try:
+        with open(path) as f:
+            cache = json.load(f)
+    except (IOError, OSError, ValueError):
+        return None
+    if not isinstance(cache, dict) or not isinstance(cache.get('facts'), dict):
+        return None
+    if cache.get('xms') != xms or cache.get('expires', 0) < time.time():
+        return None
+    return cache['facts']
+
+
+def write_json_file(path, data):
+    """Atomically replace path with data as JSON"""
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)))
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f)
+        os.rename(tmp, path)
+    except Exception:
+        os.unlink(tmp)
+        raise
+
+
+def write_facts_cache(path, xms, facts, ttl, sync=None):
+    """Atomically write facts for xms to path, valid for ttl seconds
+
+    sync is the point in the XMS event log the facts are current as of,
+    for incremental updates (see xtremio_sync).
+    """
+    cache = dict(xms=xms, expires=time.time() + ttl, facts=facts)
+    if sync is not None:
+        cache['sync'] = sync
+    write_json_file(path, cache)
+
+
+def list_objects(rest, objtype, props=None, cache=None):
+    """Iterate over objtype from the facts cache if it holds it, otherwise from the XMS
+
+    Objects from the XMS are streamed a page at a time, so consume the
+    result once, building whatever index is needed as it goes.
+    """
+    if cache and FACT_TYPES.get(objtype) in cache:
+        return iter(cache[FACT_TYPES[objtype]].values())
+    return rest.iter_objects(objtype, props)
+
+
+def run_parallel(func, items, max_workers=DEFAULT_WORKERS):
+    """Call func(item) for every item using a bounded pool of threads.
+
+    Returns a list of (item, result, error) tuples in the same order as
+    items. error is None on success, otherwise the exception func raised.
+    """
+    items = list(items)
+
+    def call(item):
+        try:
+            return item, func(item), None
+        except Exception as e:
+            return item, None, e
+
+    if max_workers is None or max_workers <= 1 or len(items) <= 1:
+        return [call(item) for item in items]
+
+    pool = ThreadPool(min(max_workers, len(items)))
+    try:
+        return pool.map(call, items, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def wait_for(check, timeout, delay=1.0, max_delay=30.0):
+    """Poll check() with exponential backoff until it returns something true.
+
+    Returns check()'s result, or raises an Exception once timeout seconds
+    have passed.
+    """
+    deadline = time.time() + timeout
+    while True:
+        result = check()
+        if result:
+            return result
+        if time.time() + delay > deadline:
+            raise Exception('timed out after %d seconds' % timeout)
+        time.sleep(delay)
+        delay = min(delay * 2, max_delay)
+
+
+def failed_items(results):
+    """Return the (item, error) pairs from run_parallel results that failed"""
+    return [(item, error) for item, result, error in results if error is not None]